@@ -0,0 +1,103 @@
+"""
+Subidas por diferencias (GetSignatures + UploadDelta) contra un peer gRPC en
+marcha: sube un archivo al azar completo con UploadFile, le inserta --edits
+bytes nuevos en una posición al azar y sube la versión nueva con send_delta.
+Después la descarga con DownloadFile y compara el sha256, así que también
+sirve para probar el camino completo de punta a punta.
+
+Por cada tamaño de edición muestra los bytes literales enviados frente al
+tamaño del archivo. Cada edición parte de la misma versión base.
+
+Uso (desde Implementacion_Nube, con el peer levantado):
+    python benchmarks/delta_upload.py --target localhost:50051 --size 8 --edits 0 100 10000 1000000
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "peer1", "server"))
+
+import grpc
+import grpc_pb2
+import grpc_pb2_grpc
+from delta import send_delta
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+async def upload(stub, filename: str, data: bytes):
+    """Subir data completo con UploadFile"""
+    async def chunks():
+        for number, offset in enumerate(range(0, len(data), UPLOAD_CHUNK_SIZE)):
+            yield grpc_pb2.FileChunk(
+                content=data[offset:offset + UPLOAD_CHUNK_SIZE], filename=filename,
+                chunk_number=number, offset=offset, file_size=len(data),
+            )
+    status = await stub.UploadFile(chunks())
+    if not status.success:
+        raise RuntimeError(f"UploadFile falló: {status.message}")
+
+
+async def download_sha256(stub, filename: str):
+    hasher = hashlib.sha256()
+    async for chunk in stub.DownloadFile(grpc_pb2.FileRequest(filename=filename)):
+        hasher.update(chunk.content)
+    return hasher.hexdigest()
+
+
+async def run(target: str, filename: str, size: int, edits, block_size: int):
+    async with grpc.aio.insecure_channel(target) as channel:
+        stub = grpc_pb2_grpc.FileServiceStub(channel)
+        base = random.randbytes(size)
+        for edit in edits:
+            await upload(stub, filename, base)
+            position = random.randrange(size + 1)
+            new = base[:position] + random.randbytes(edit) + base[position:]
+
+            start = time.monotonic()
+            result = await send_delta(stub, filename, io.BytesIO(new), block_size)
+            seconds = time.monotonic() - start
+            if result is None:
+                raise RuntimeError(f"El peer no tiene {filename}: no hay base para las diferencias")
+            status, encoder = result
+            if not status.success:
+                raise RuntimeError(f"UploadDelta falló: {status.message}")
+            ok = await download_sha256(stub, filename) == hashlib.sha256(new).hexdigest()
+            yield edit, len(new), encoder.literal_bytes, encoder.copied_bytes, seconds, ok
+
+
+async def report(args):
+    async for edit, total, literal, copied, seconds, ok in run(
+        args.target, args.filename, args.size * 1024 * 1024, args.edits, args.block_size
+    ):
+        print(
+            f"{edit:>10} {total:>12} {literal:>12} {copied:>12} {literal / total:>10.2%}"
+            f" {seconds:>8.3f} {'ok' if ok else 'DISTINTO':>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes enviados por UploadDelta según el tamaño de la edición")
+    parser.add_argument("--target", default="localhost:50051")
+    parser.add_argument("--filename", default="delta_benchmark.bin")
+    parser.add_argument("--size", type=int, default=8, help="Tamaño del archivo en MiB")
+    parser.add_argument("--edits", type=int, nargs="+", default=[0, 100, 10_000, 1_000_000])
+    parser.add_argument("--block-size", type=int, default=0, help="0 = lo elige el peer")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(
+        f"{'edición':>10} {'tamaño':>12} {'literales':>12} {'copiados':>12} {'enviado':>10}"
+        f" {'segundos':>8} {'sha256':>10}"
+    )
+    asyncio.run(report(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Simulación en memoria de /locate: compara cuántos mensajes cuesta localizar
+un archivo con el modo "query" (filtros de Bloom y /has a los peers) y con el
+modo "dht" (búsqueda iterativa de Kademlia), para distintos tamaños de red.
+
+En el modo "query" cada nodo guarda el filtro de cada peer durante
+--summary-ttl segundos. Los locates llegan cada --interval segundos desde un
+nodo al azar. Un peer sin filtro vigente cuesta un pedido de /files/summary
+(en segundo plano) y en ese locate se le pregunta igual. Los demás reciben
+/has solo si su filtro dice que podrían tener el archivo, falsos positivos
+incluidos.
+
+Uso (desde Implementacion_Nube):
+    python benchmarks/locate_simulation.py --peers 16 64 256 512 --files 200 --lookups 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "peer1", "server"))
+
+from catalog import BloomFilter
+from dht import RoutingTable, ProviderStore, iterative_lookup, key_for
+
+
+class SimNode:
+    def __init__(self, name: str, k: int):
+        self.contact = {"name": name, "url": f"sim://{name}", "url_grpc": None}
+        self.table = RoutingTable(name, k=k)
+        self.providers = ProviderStore()
+
+    def handle(self, method: str, payload: dict):
+        self.table.update(payload["sender"])
+        key = int(payload["key"], 16)
+        if method == "add_provider":
+            self.providers.add(key, payload["provider"])
+            return {"status": "ok"}
+        reply = {"nodes": self.table.closest(key)}
+        if method == "find_providers":
+            reply["providers"] = self.providers.get(key)
+        return reply
+
+
+class SimNetwork:
+    def __init__(self, size: int, k: int):
+        self.nodes = {f"peer{i}": SimNode(f"peer{i}", k) for i in range(size)}
+        self.messages = 0
+
+    def rpc_for(self, node: SimNode):
+        async def rpc(contact: dict, method: str, payload: dict):
+            self.messages += 1
+            return self.nodes[contact["name"]].handle(method, dict(payload, sender=node.contact))
+        return rpc
+
+    async def bootstrap(self):
+        """Cada nodo entra conociendo a uno ya presente y se busca a sí mismo"""
+        joined = []
+        for node in self.nodes.values():
+            if joined:
+                node.table.update(random.choice(joined).contact)
+                await iterative_lookup(node.table, node.table.local_id, self.rpc_for(node))
+            joined.append(node)
+
+    async def publish(self, node: SimNode, filename: str):
+        key = key_for(filename)
+        rpc = self.rpc_for(node)
+        closest, _ = await iterative_lookup(node.table, key, rpc)
+        payload = {"key": format(key, "x"), "provider": node.contact}
+        for contact in closest:
+            await rpc(contact, "add_provider", payload)
+
+    async def locate(self, node: SimNode, filename: str):
+        _, providers = await iterative_lookup(node.table, key_for(filename), self.rpc_for(node), find_providers=True)
+        return providers
+
+
+async def run(size: int, files: int, lookups: int, k: int, summary_ttl: float, interval: float):
+    net = SimNetwork(size, k)
+    await net.bootstrap()
+
+    nodes = list(net.nodes.values())
+    owners = {}
+    for i in range(files):
+        filename = f"file{i}.bin"
+        owners[filename] = random.choice(nodes)
+        await net.publish(owners[filename], filename)
+
+    net.messages = 0
+    hits = 0
+    for _ in range(lookups):
+        filename = random.choice(list(owners))
+        providers = await net.locate(random.choice(nodes), filename)
+        hits += any(p["name"] == owners[filename].contact["name"] for p in providers)
+
+    query = simulate_query(nodes, owners, lookups, summary_ttl, interval)
+    return query, net.messages / lookups, hits / lookups
+
+
+def simulate_query(nodes, owners, lookups: int, summary_ttl: float, interval: float):
+    """
+    Mensajes por locate del modo "query", como lo hace _locate_by_query.
+    Devuelve (mensajes, pedidos de filtro, /has, falsos positivos del filtro).
+    """
+    files_of = {node.contact["name"]: [] for node in nodes}
+    for filename, owner in owners.items():
+        files_of[owner.contact["name"]].append(filename)
+    summaries = {name: BloomFilter.from_items(files) for name, files in files_of.items()}
+    # Filtros cacheados por cada nodo: {nodo: {peer: instante en que se pidió}}
+    fetched_at = {node.contact["name"]: {} for node in nodes}
+
+    summary_msgs = has_msgs = false_positives = 0
+    now = 0.0
+    for _ in range(lookups):
+        now += interval
+        filename = random.choice(list(owners))
+        local = random.choice(nodes).contact["name"]
+        cache = fetched_at[local]
+        for peer in files_of:
+            if peer == local:
+                continue
+            if now - cache.get(peer, float("-inf")) > summary_ttl:
+                # Sin filtro vigente: se pide y mientras tanto se pregunta igual
+                summary_msgs += 1
+                cache[peer] = now
+            elif summaries[peer].might_contain(filename):
+                false_positives += filename not in files_of[peer]
+            else:
+                continue
+            has_msgs += 1
+
+    return tuple(n / lookups for n in (summary_msgs + has_msgs, summary_msgs, has_msgs, false_positives))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mensajes por locate: query vs dht")
+    parser.add_argument("--peers", type=int, nargs="+", default=[16, 64, 256, 512])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--summary-ttl", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=0.1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(
+        f"{'peers':>6} {'query msgs':>11} {'summaries':>10} {'has':>7} {'false pos':>10}"
+        f" {'dht msgs':>9} {'dht hit rate':>13}"
+    )
+    for size in args.peers:
+        (query_msgs, summary_msgs, has_msgs, false_positives), dht_msgs, hit_rate = asyncio.run(
+            run(size, args.files, args.lookups, args.k, args.summary_ttl, args.interval)
+        )
+        print(
+            f"{size:>6} {query_msgs:>11.1f} {summary_msgs:>10.1f} {has_msgs:>7.1f} {false_positives:>10.2f}"
+            f" {dht_msgs:>9.1f} {hit_rate:>13.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import asyncio
+import time
+
+import grpc
+
+# --------- Pool de canales gRPC hacia otros peers ----------
+# Estados en los que un canal ya no sirve y conviene crearlo de nuevo
+# (así además se reinicia su backoff de reconexión)
+BROKEN_STATES = (grpc.ChannelConnectivity.TRANSIENT_FAILURE, grpc.ChannelConnectivity.SHUTDOWN)
+
+
+def keepalive_options(keepalive_time: float, keepalive_timeout: float):
+    """Opciones de keepalive para los canales del pool"""
+    return [
+        ("grpc.keepalive_time_ms", int(keepalive_time * 1000)),
+        ("grpc.keepalive_timeout_ms", int(keepalive_timeout * 1000)),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+    ]
+
+
+def server_keepalive_options(keepalive_time: float):
+    """Opciones para que el servidor acepte los pings de los canales del pool"""
+    return [
+        ("grpc.keepalive_permit_without_calls", 1),
+        # Con margen: un ping que llega un poco antes de tiempo cuenta como abuso
+        # y el servidor termina cerrando la conexión (GOAWAY "too_many_pings")
+        ("grpc.http2.min_ping_interval_without_data_ms", int(keepalive_time * 1000 / 2)),
+    ]
+
+
+class CallCounter:
+    """
+    Lleva en entry["active"] las llamadas en curso de un canal del pool; al
+    terminar la última, el canal empieza a contar como ocioso
+    """
+
+    def __init__(self, entry: dict):
+        self.entry = entry
+
+    async def _track(self, continuation, client_call_details, request):
+        self.entry["active"] += 1
+        try:
+            call = await continuation(client_call_details, request)
+        except BaseException:
+            self._done(None)
+            raise
+        call.add_done_callback(self._done)
+        return call
+
+    def _done(self, call):
+        self.entry["active"] -= 1
+        self.entry["last_used"] = time.monotonic()
+
+
+# grpc.aio registra cada interceptor para un solo tipo de llamada: uno por tipo
+class UnaryUnaryCounter(CallCounter, grpc.aio.UnaryUnaryClientInterceptor):
+    intercept_unary_unary = CallCounter._track
+
+
+class UnaryStreamCounter(CallCounter, grpc.aio.UnaryStreamClientInterceptor):
+    intercept_unary_stream = CallCounter._track
+
+
+class StreamUnaryCounter(CallCounter, grpc.aio.StreamUnaryClientInterceptor):
+    intercept_stream_unary = CallCounter._track
+
+
+class StreamStreamCounter(CallCounter, grpc.aio.StreamStreamClientInterceptor):
+    intercept_stream_stream = CallCounter._track
+
+
+def call_counters(entry: dict):
+    """Interceptores que cuentan en entry["active"] las llamadas de cualquier tipo"""
+    return [cls(entry) for cls in (UnaryUnaryCounter, UnaryStreamCounter, StreamUnaryCounter, StreamStreamCounter)]
+
+
+class ChannelPool:
+    """
+    Un canal grpc.aio por destino ("host:puerto"), reutilizado entre pedidos
+    para no pagar el handshake TCP + HTTP/2 en cada salto del flooding.
+
+    Los canales mandan pings de keepalive cada keepalive_time segundos, así una
+    conexión caída se detecta aunque no haya llamadas. Un canal roto se
+    reemplaza al pedirlo y maintain() cierra los que llevan idle_timeout
+    segundos sin usarse o quedaron rotos. Un canal con llamadas en curso
+    (p. ej. una réplica larga) nunca cuenta como ocioso.
+    """
+
+    def __init__(self, idle_timeout: float = 300, keepalive_time: float = 30, keepalive_timeout: float = 10):
+        self.idle_timeout = idle_timeout
+        self.options = keepalive_options(keepalive_time, keepalive_timeout)
+        self._channels = {}  # {destino: {"channel", "created_at", "last_used", "uses", "active"}}
+
+    async def get(self, target: str):
+        """Canal hacia target, creándolo si no hay uno sano"""
+        entry = self._channels.get(target)
+        if entry is not None and entry["channel"].get_state() in BROKEN_STATES:
+            await self.close(target)
+            entry = None
+        if entry is None:
+            entry = self._channels[target] = {
+                "created_at": time.monotonic(),
+                "last_used": None,
+                "uses": 0,
+                "active": 0,
+            }
+            entry["channel"] = grpc.aio.insecure_channel(
+                target, options=self.options, interceptors=call_counters(entry)
+            )
+        entry["last_used"] = time.monotonic()
+        entry["uses"] += 1
+        return entry["channel"]
+
+    async def check(self, target: str, timeout: float = 5):
+        """True si el canal hacia target logra conectarse antes de timeout segundos"""
+        channel = await self.get(target)
+        try:
+            await asyncio.wait_for(channel.channel_ready(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def maintain(self):
+        """
+        Cerrar los canales ociosos o rotos; devuelve los destinos cerrados.
+        Los que tienen llamadas en curso no se tocan aunque haga mucho que no
+        se piden: cerrarlos cortaría esas llamadas.
+        """
+        now = time.monotonic()
+        stale = [
+            target for target, entry in self._channels.items()
+            if not entry["active"] and (
+                now - entry["last_used"] > self.idle_timeout
+                or entry["channel"].get_state() in BROKEN_STATES
+            )
+        ]
+        for target in stale:
+            await self.close(target)
+        return stale
+
+    async def close(self, target: str):
+        entry = self._channels.pop(target, None)
+        if entry is not None:
+            await entry["channel"].close()
+
+    async def close_all(self):
+        for target in list(self._channels):
+            await self.close(target)
+
+    def to_dict(self):
+        now = time.monotonic()
+        return {
+            target: {
+                "state": entry["channel"].get_state().name.lower(),
+                "age": round(now - entry["created_at"], 3),
+                "idle": round(now - entry["last_used"], 3),
+                "uses": entry["uses"],
+                "active": entry["active"],
+            }
+            for target, entry in self._channels.items()
+        }
+
+    def __len__(self):
+        return len(self._channels)
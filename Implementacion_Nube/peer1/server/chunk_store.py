@@ -0,0 +1,405 @@
+import fcntl
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+
+# --------- Chunking definido por contenido (FastCDC) ----------
+# Tabla fija del hash gear, derivada de sha256 para que todos los peers corten igual
+GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big") for i in range(256)]
+MASK_64 = (1 << 64) - 1
+
+
+def find_cut(data, min_size: int, avg_size: int, max_size: int):
+    """
+    Largo del primer chunk de data según FastCDC: un hash gear rodante sobre
+    los bytes, sin mirar los primeros min_size. Antes de avg_size se exige una
+    máscara más difícil y después una más fácil (chunking normalizado), así los
+    tamaños se juntan cerca de avg_size; nunca se pasa de max_size.
+    Como el corte depende solo de los bytes cercanos, un cambio en una parte
+    del archivo no mueve los cortes del resto.
+    """
+    n = len(data)
+    if n <= min_size:
+        return n
+    end = min(n, max_size)
+    normal = min(end, avg_size)
+    bits = avg_size.bit_length() - 1
+    # Se usan los bits altos: en el hash gear son los que dependen de más bytes
+    mask_s = ((1 << (bits + 1)) - 1) << (64 - bits - 1)
+    mask_l = ((1 << (bits - 1)) - 1) << (64 - bits + 1)
+    gear = GEAR
+    h = 0
+    i = min_size
+    while i < normal:
+        h = ((h << 1) + gear[data[i]]) & MASK_64
+        if not h & mask_s:
+            return i + 1
+        i += 1
+    while i < end:
+        h = ((h << 1) + gear[data[i]]) & MASK_64
+        if not h & mask_l:
+            return i + 1
+        i += 1
+    return end
+
+
+def iter_chunks(f, min_size: int, avg_size: int, max_size: int):
+    """Partir el contenido de un archivo abierto en chunks definidos por contenido"""
+    buffer = b""
+    position = 0
+    eof = False
+    while True:
+        if not eof and len(buffer) - position < max_size:
+            data = f.read(max(4 * max_size, 1024 * 1024))
+            eof = not data
+            buffer = buffer[position:] + data
+            position = 0
+            continue
+        if position >= len(buffer):
+            return
+        cut = find_cut(memoryview(buffer)[position:], min_size, avg_size, max_size)
+        yield buffer[position:position + cut]
+        position += cut
+
+
+def chunk_digest(data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_digest(value: str):
+    """True si value tiene forma de sha256 en hexadecimal (así se usa como nombre de archivo)"""
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+def manifest_version(chunks):
+    """Versión de un archivo armado con chunks: cambia si cambia cualquier chunk"""
+    return hashlib.sha256("".join(digest for digest, _ in chunks).encode()).hexdigest()[:16]
+
+
+def chunk_sizes(chunks):
+    """
+    Validar la lista de chunks de un manifiesto ([[sha256, tamaño], ...]) y
+    devolver {sha256: tamaño}. ValueError si está mal formada o si un mismo
+    chunk aparece con dos tamaños distintos.
+    """
+    if not isinstance(chunks, list):
+        raise ValueError("La lista de chunks del manifiesto no es válida")
+    sizes = {}
+    for entry in chunks:
+        if not (isinstance(entry, list) and len(entry) == 2 and isinstance(entry[0], str)
+                and is_digest(entry[0]) and type(entry[1]) is int and entry[1] > 0):
+            raise ValueError(f"Entrada de chunk inválida en el manifiesto: {entry!r}")
+        digest, size = entry
+        if sizes.setdefault(digest, size) != size:
+            raise ValueError(f"El chunk {digest} figura con dos tamaños distintos")
+    return sizes
+
+
+# --------- Almacén de chunks deduplicado ----------
+class ChunkStoreError(Exception):
+    """Un manifiesto hace referencia a chunks que no están en el almacén"""
+
+
+class ChunkStore:
+    """
+    Almacén de archivos partidos en chunks definidos por contenido, guardados
+    una sola vez por su sha256 aunque aparezcan en muchos archivos (versiones
+    de un log, datasets casi iguales...).
+
+    directory/chunks/ab/abcd...   datos de cada chunk
+    directory/manifests/*.json    por archivo: tamaño, versión y lista de chunks
+    directory/refs.json           por chunk: [referencias, tamaño]
+
+    Un chunk se borra cuando ningún manifiesto lo usa. El servidor REST y el
+    gRPC comparten el almacén: los cambios de referencias se hacen con un
+    flock sobre directory/lock y los manifiestos se escriben con os.replace.
+    Los métodos bloquean: en código async se llaman desde un hilo.
+    """
+
+    def __init__(self, directory: str, min_size: int = 16 * 1024, avg_size: int = 64 * 1024,
+                 max_size: int = 256 * 1024):
+        self.directory = directory
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self._chunks_dir = os.path.join(directory, "chunks")
+        self._manifests_dir = os.path.join(directory, "manifests")
+        self._refs_path = os.path.join(directory, "refs.json")
+        self._lock_path = os.path.join(directory, "lock")
+        os.makedirs(self._chunks_dir, exist_ok=True)
+        os.makedirs(self._manifests_dir, exist_ok=True)
+
+    def put_file(self, filename: str, path: str):
+        """Partir el archivo en path y guardarlo como filename; devuelve su manifiesto"""
+        for attempt in range(2):
+            chunks = []
+            with open(path, "rb") as f:
+                for data in iter_chunks(f, self.min_size, self.avg_size, self.max_size):
+                    digest = chunk_digest(data)
+                    self._write_chunk(digest, data)
+                    chunks.append([digest, len(data)])
+            try:
+                return self.commit(filename, chunks)
+            except ChunkStoreError:
+                # Otro proceso borró un chunk compartido entre la escritura y el
+                # commit: se vuelve a escribir
+                if attempt:
+                    raise
+
+    def add_chunk(self, digest: str, data: bytes, size: int = None):
+        """Guardar un chunk recibido de otro peer, verificando su tamaño (si se indica) y su hash"""
+        if size is not None and len(data) != size:
+            raise ValueError(f"El chunk {digest} mide {len(data)} bytes y no {size}")
+        if chunk_digest(data) != digest:
+            raise ValueError(f"El chunk {digest} no coincide con su hash")
+        self._write_chunk(digest, data)
+
+    def missing(self, digests):
+        """Los chunks de digests que no están en el almacén (sin repetir)"""
+        return [d for d in dict.fromkeys(digests) if not os.path.exists(self._chunk_path(d))]
+
+    def commit(self, filename: str, chunks):
+        """
+        Publicar filename como la secuencia chunks ([[sha256, tamaño], ...]),
+        que ya deben estar en el almacén. Reemplaza la versión anterior.
+        Los tamaños se comparan con los chunks guardados (ValueError si no
+        coinciden): un manifiesto ajeno no puede desajustar las referencias.
+        """
+        sizes = chunk_sizes(chunks)
+        with self._locked():
+            missing = self.missing(sizes)
+            if missing:
+                raise ChunkStoreError(f"Faltan {len(missing)} chunks de {filename}")
+            for digest, size in sizes.items():
+                if os.path.getsize(self._chunk_path(digest)) != size:
+                    raise ValueError(f"El chunk {digest} no mide {size} bytes")
+            refs = self._load_refs()
+            for digest, size in chunks:
+                refs[digest] = [refs.get(digest, [0])[0] + 1, size]
+            old = self.manifest(filename)
+            manifest = {
+                "filename": filename,
+                "size": sum(size for _, size in chunks),
+                "version": manifest_version(chunks),
+                "chunks": chunks,
+            }
+            self._write_json(self._manifest_path(filename), manifest)
+            if old is not None:
+                self._release(refs, old["chunks"])
+            self._write_json(self._refs_path, refs)
+        return manifest
+
+    def remove(self, filename: str):
+        with self._locked():
+            old = self.manifest(filename)
+            if old is None:
+                return
+            os.remove(self._manifest_path(filename))
+            refs = self._load_refs()
+            self._release(refs, old["chunks"])
+            self._write_json(self._refs_path, refs)
+
+    def manifest(self, filename: str):
+        try:
+            with open(self._manifest_path(filename), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read(self, manifest: dict, offset: int = 0, length: int = None):
+        """
+        Rearmar el archivo de un manifiesto, solo la ventana [offset, offset + length),
+        de a un chunk por vez. Si el archivo se reemplaza durante la lectura puede
+        faltar un chunk viejo: la lectura falla, nunca mezcla versiones.
+        """
+        end = manifest["size"] if length is None else min(manifest["size"], offset + length)
+        position = 0
+        for digest, size in manifest["chunks"]:
+            if position >= end:
+                return
+            if position + size > offset:
+                yield self.read_chunk(digest)[max(0, offset - position):end - position]
+            position += size
+
+    def read_chunk(self, digest: str):
+        with open(self._chunk_path(digest), "rb") as f:
+            return f.read()
+
+    def open(self, filename: str):
+        """El archivo para leer como uno común (StoredFile), o None si no está"""
+        manifest = self.manifest(filename)
+        return StoredFile(self, manifest) if manifest is not None else None
+
+    def files(self):
+        """Nombres de los archivos guardados"""
+        names = []
+        for entry in os.listdir(self._manifests_dir):
+            if entry.endswith(".json"):
+                try:
+                    with open(os.path.join(self._manifests_dir, entry), "r") as f:
+                        names.append(json.load(f)["filename"])
+                except (FileNotFoundError, ValueError):
+                    continue  # se está reemplazando
+        return names
+
+    def to_dict(self):
+        with self._locked():
+            refs = self._load_refs()
+        logical = 0
+        files = self.files()
+        for filename in files:
+            manifest = self.manifest(filename)
+            logical += manifest["size"] if manifest else 0
+        stored = sum(size for _, size in refs.values())
+        return {
+            "files": len(files),
+            "chunks": len(refs),
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "dedup_ratio": round(logical / stored, 3) if stored else None,
+        }
+
+    def _release(self, refs: dict, chunks):
+        """Quitar una referencia a cada chunk y borrar los que quedan sin usar"""
+        for digest, _ in chunks:
+            if digest not in refs:
+                continue
+            refs[digest][0] -= 1
+            if refs[digest][0] <= 0:
+                del refs[digest]
+                try:
+                    os.remove(self._chunk_path(digest))
+                except FileNotFoundError:
+                    pass
+
+    def _write_chunk(self, digest: str, data: bytes):
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return  # ya está: es el mismo contenido
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{uuid.uuid4().hex}.part"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def _chunk_path(self, digest: str):
+        return os.path.join(self._chunks_dir, digest[:2], digest)
+
+    def _manifest_path(self, filename: str):
+        return os.path.join(self._manifests_dir, hashlib.sha1(filename.encode("utf-8")).hexdigest() + ".json")
+
+    def _load_refs(self):
+        try:
+            with open(self._refs_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_json(self, path: str, data):
+        temp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp, "w") as f:
+            json.dump(data, f)
+        os.replace(temp, path)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class StoredFile:
+    """Un archivo del almacén abierto para leer, con read/seek/tell como uno abierto en modo 'rb'"""
+
+    def __init__(self, store: ChunkStore, manifest: dict):
+        self.store = store
+        self.manifest = manifest
+        self._position = 0
+
+    def read(self, size: int = -1):
+        start = self._position
+        end = self.manifest["size"] if size is None or size < 0 else min(start + size, self.manifest["size"])
+        if start >= end:
+            return b""
+        self._position = end
+        return b"".join(self.store.read(self.manifest, start, end - start))
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: self.manifest["size"]}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileChunker:
+    """
+    Manifiestos de archivos comunes (fuera del almacén) para poder enviarlos
+    por chunks: se calculan al pedirlos y se recuerdan mientras el archivo no
+    cambie, junto con dónde está cada chunk para servirlo por su hash.
+    """
+
+    def __init__(self, min_size: int = 16 * 1024, avg_size: int = 64 * 1024, max_size: int = 256 * 1024,
+                 max_files: int = 256):
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.max_files = max_files
+        self._manifests = {}  # {ruta: ((tamaño, mtime), manifiesto)}
+        self._locations = {}  # {sha256: (ruta, offset, tamaño)}
+
+    def manifest(self, filename: str, path: str):
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        cached = self._manifests.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        chunks = []
+        offset = 0
+        with open(path, "rb") as f:
+            for data in iter_chunks(f, self.min_size, self.avg_size, self.max_size):
+                digest = chunk_digest(data)
+                chunks.append([digest, len(data)])
+                self._locations[digest] = (path, offset, len(data))
+                offset += len(data)
+        manifest = {"filename": filename, "size": offset, "version": manifest_version(chunks), "chunks": chunks}
+        if len(self._manifests) >= self.max_files and path not in self._manifests:
+            self._forget(next(iter(self._manifests)))
+        self._manifests[path] = (key, manifest)
+        return manifest
+
+    def read_chunk(self, digest: str):
+        """Datos del chunk, o None si no es de ningún archivo conocido (o cambió)"""
+        location = self._locations.get(digest)
+        if location is None:
+            return None
+        path, offset, size = location
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read(size)
+        except FileNotFoundError:
+            return None
+        return data if chunk_digest(data) == digest else None
+
+    def _forget(self, path: str):
+        _, manifest = self._manifests.pop(path)
+        for digest, _ in manifest["chunks"]:
+            if self._locations.get(digest, (None,))[0] == path:
+                del self._locations[digest]
@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import threading
+import time
+
+# --------- DHT estilo Kademlia para localizar archivos ----------
+ID_BITS = 160
+
+def key_for(value: str):
+    """Identificador de 160 bits (sha1) para un nombre de peer o de archivo"""
+    return int.from_bytes(hashlib.sha1(value.encode("utf-8")).digest(), "big")
+
+def _contact(peer: dict):
+    return {"name": peer["name"], "url": peer["url"], "url_grpc": peer.get("url_grpc")}
+
+
+class RoutingTable:
+    """
+    Tabla de ruteo de Kademlia: un k-bucket por cada bit de distancia XOR.
+    Cada bucket guarda hasta k contactos, del más viejo al más reciente;
+    si está lleno se conservan los viejos (los que llevan más tiempo vivos).
+    """
+
+    def __init__(self, local_name: str, k: int = 20):
+        self.local_name = local_name
+        self.local_id = key_for(local_name)
+        self.k = k
+        self._buckets = [[] for _ in range(ID_BITS)]
+        self._lock = threading.Lock()
+
+    def update(self, peer: dict):
+        """Registrar (o refrescar) un contacto"""
+        if not peer.get("name") or not peer.get("url") or peer["name"] == self.local_name:
+            return
+        bucket = self._buckets[self._bucket_index(key_for(peer["name"]))]
+        with self._lock:
+            for i, contact in enumerate(bucket):
+                if contact["name"] == peer["name"]:
+                    del bucket[i]
+                    bucket.append(_contact(peer))
+                    return
+            if len(bucket) < self.k:
+                bucket.append(_contact(peer))
+
+    def remove(self, name: str):
+        """Quitar un contacto que no responde"""
+        if name == self.local_name:
+            return
+        bucket = self._buckets[self._bucket_index(key_for(name))]
+        with self._lock:
+            bucket[:] = [c for c in bucket if c["name"] != name]
+
+    def closest(self, key: int, count: int = None):
+        """Los count contactos más cercanos a key por distancia XOR"""
+        with self._lock:
+            contacts = [c for bucket in self._buckets for c in bucket]
+        contacts.sort(key=lambda c: key_for(c["name"]) ^ key)
+        return contacts[:count or self.k]
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets)
+
+    def _bucket_index(self, node_id: int):
+        return max((self.local_id ^ node_id).bit_length() - 1, 0)
+
+
+class ProviderStore:
+    """Registros "este peer tiene el archivo" guardados en este nodo, con expiración"""
+
+    def __init__(self, ttl: float = 7200):
+        self.ttl = ttl
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: int, provider: dict):
+        with self._lock:
+            self._records.setdefault(key, {})[provider["name"]] = (_contact(provider), time.monotonic() + self.ttl)
+
+    def get(self, key: int):
+        now = time.monotonic()
+        with self._lock:
+            records = self._records.get(key, {})
+            for name in [n for n, (_, expires) in records.items() if expires < now]:
+                del records[name]
+            return [contact for contact, _ in records.values()]
+
+
+async def iterative_lookup(table: RoutingTable, key: int, rpc, find_providers: bool = False, alpha: int = 3):
+    """
+    Búsqueda iterativa de Kademlia.
+
+    rpc(contact, method, payload) es una corrutina que llama a
+    "find_node" o "find_providers" en el contacto y devuelve un dict con
+    "nodes" (y "providers"). Se consulta en paralelo a los alpha contactos
+    más cercanos aún no preguntados, hasta que los k más cercanos ya
+    respondieron o, si se buscan proveedores, hasta encontrar alguno.
+
+    Devuelve (k contactos más cercanos que respondieron, proveedores).
+    """
+    method = "find_providers" if find_providers else "find_node"
+    payload = {"key": format(key, "x")}
+
+    shortlist = {c["name"]: c for c in table.closest(key)}
+    queried, responded, failed = set(), {}, set()
+    providers = {}
+
+    def distance(contact):
+        return key_for(contact["name"]) ^ key
+
+    while True:
+        nearest = sorted(
+            (c for c in shortlist.values() if c["name"] not in failed), key=distance
+        )[:table.k]
+        batch = [c for c in nearest if c["name"] not in queried][:alpha]
+        if not batch:
+            break
+
+        queried.update(c["name"] for c in batch)
+        replies = await asyncio.gather(*(rpc(c, method, payload) for c in batch), return_exceptions=True)
+        for contact, reply in zip(batch, replies):
+            if isinstance(reply, Exception):
+                failed.add(contact["name"])
+                table.remove(contact["name"])
+                continue
+            responded[contact["name"]] = contact
+            table.update(contact)
+            for node in reply.get("nodes", []):
+                if node.get("name") and node["name"] != table.local_name:
+                    shortlist.setdefault(node["name"], _contact(node))
+            for provider in reply.get("providers", []):
+                providers[provider["name"]] = _contact(provider)
+
+        if find_providers and providers:
+            break
+
+    closest = sorted(responded.values(), key=distance)[:table.k]
+    return closest, list(providers.values())
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# --------- Caché en disco de archivos traídos de otros peers ----------
+class FileCache:
+    """
+    Caché en disco, acotada en bytes, de los archivos que este peer
+    retransmite desde otros peers.
+
+    Los archivos se guardan en directory (separado de la carpeta compartida,
+    así no se publican como propios) y un índice JSON guarda por cada uno su
+    tamaño, versión/ETag, peer de origen, último acceso y número de aciertos.
+    Al pasar de max_bytes se expulsa el menos usado recientemente ("lru")
+    o el de menos aciertos ("lfu"). Una entrada vence a los ttl segundos.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3, ttl: float = 300, policy: str = "lru"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+        self._index_path = os.path.join(directory, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Restos de escrituras que no terminaron (p. ej. por un reinicio)
+        for name in os.listdir(directory):
+            if name.endswith(".part"):
+                os.remove(os.path.join(directory, name))
+        self._entries = self._load_index()
+
+    def get(self, filename: str):
+        """Metadatos (con "path") del archivo cacheado, o None si no está o venció"""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return None
+            if time.time() - entry["stored_at"] > self.ttl or not os.path.exists(entry["path"]):
+                self._remove(filename)
+                self._save_index()
+                return None
+            entry["last_access"] = time.time()
+            entry["hits"] += 1
+            return dict(entry)
+
+    def fits(self, size: int):
+        """True si un archivo de ese tamaño puede guardarse"""
+        return size <= self.max_bytes
+
+    def temp_path(self, filename: str):
+        """Ruta para un archivo que se está descargando (se borra si quedó a medias)"""
+        return f"{self._path_for(filename)}.{threading.get_ident()}.{time.monotonic_ns()}.part"
+
+    def invalidate(self, filenames=None):
+        """
+        Olvidar esos archivos (o todos si no se indica ninguno).
+        Borra archivos y reescribe el índice: en código async se llama desde un hilo.
+        """
+        with self._lock:
+            removed = False
+            for filename in list(self._entries) if filenames is None else filenames:
+                if filename in self._entries:
+                    self._remove(filename)
+                    removed = True
+            if removed:
+                self._save_index()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "bytes": sum(e["size"] for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+                "policy": self.policy,
+                "entries": {
+                    name: {k: v for k, v in e.items() if k != "path"}
+                    for name, e in self._entries.items()
+                },
+            }
+
+    def add(self, filename: str, temp_path: str, size: int, **meta):
+        """Mover un archivo completo a la caché, expulsando lo necesario para que quepa"""
+        with self._lock:
+            if filename in self._entries:
+                self._remove(filename)
+            used = sum(e["size"] for e in self._entries.values())
+            while self._entries and used + size > self.max_bytes:
+                victim = self._pick_victim()
+                used -= self._entries[victim]["size"]
+                self._remove(victim)
+            path = self._path_for(filename)
+            os.replace(temp_path, path)
+            now = time.time()
+            self._entries[filename] = dict(
+                meta, path=path, size=size, stored_at=now, last_access=now, hits=0
+            )
+            self._save_index()
+
+    def _pick_victim(self):
+        if self.policy == "lfu":
+            return min(self._entries, key=lambda n: (self._entries[n]["hits"], self._entries[n]["last_access"]))
+        return min(self._entries, key=lambda n: self._entries[n]["last_access"])
+
+    def _remove(self, filename: str):
+        entry = self._entries.pop(filename)
+        try:
+            os.remove(entry["path"])
+        except FileNotFoundError:
+            pass
+
+    def _path_for(self, filename: str):
+        return os.path.join(self.directory, hashlib.sha1(filename.encode("utf-8")).hexdigest())
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            entries = {}
+        # Descartar entradas cuyo archivo ya no existe
+        return {name: e for name, e in entries.items() if os.path.exists(e.get("path", ""))}
+
+    def _save_index(self):
+        temp = self._index_path + ".tmp"
+        with open(temp, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(temp, self._index_path)
+
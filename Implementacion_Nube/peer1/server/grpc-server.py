@@ -1,9 +1,24 @@
 import os, json
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from concurrent import futures
 import grpc
 import grpc_pb2
 import grpc_pb2_grpc
-import requests
+import httpx
+from catalog import FileIndex, BloomFilter
+from peer_stats import PeerStats
+from circuit_breaker import CircuitBreaker
+from file_cache import FileCache
+from single_flight import Flight, FlightError, FlightGroup
+from channel_pool import ChannelPool, server_keepalive_options
+from upload import StagedFile
+from chunk_store import ChunkStore
+from delta import SIGNATURE_BATCH, DeltaDecoder, DeltaError, iter_signatures, pick_block_size, take
+from replication import CHAIN_QUEUE_SIZE, offer, pick_replicas, queue_items
 
 # ----------------- Configuración -----------------
 def load_config(path: str):
@@ -16,126 +31,1026 @@ config = load_config(CONFIG_PATH)
 DIRECTORY = "peer1/server/shared_files_peer1"  
 LOCAL_PEER_NAME = "peer1"
 
+# Almacén de chunks deduplicado (storage_engine = "chunks"), compartido con el servidor REST
+STORAGE_ENGINE = config.get("storage_engine", "files")
+chunk_store = ChunkStore(
+    config.get("chunk_store_dir", os.path.join(DIRECTORY, ".chunks")),
+    min_size=config.get("chunk_min_size", 16 * 1024),
+    avg_size=config.get("chunk_avg_size", 64 * 1024),
+    max_size=config.get("chunk_max_size", 256 * 1024),
+) if STORAGE_ENGINE == "chunks" else None
+
 # Tabla de archivos conocidos por este peer
-peer_files = {
-    LOCAL_PEER_NAME: [
-        f for f in os.listdir(DIRECTORY) if os.path.isfile(os.path.join(DIRECTORY, f))
-    ]
-}
+peer_files = FileIndex()
+peer_files.replace_peer(LOCAL_PEER_NAME, [
+    f for f in os.listdir(DIRECTORY) if os.path.isfile(os.path.join(DIRECTORY, f))
+] + (chunk_store.files() if chunk_store is not None else []))
+
+print(peer_files.to_dict())
+
+# RTT, throughput y tasa de error (EWMA) de cada peer remoto
+peer_stats = PeerStats(alpha=config.get("stats_alpha", 0.3))
+
+# Circuit breaker por peer: los que fallan seguido se saltan hasta que se recuperen
+breaker = CircuitBreaker(
+    failure_threshold=config.get("breaker_failures", 3),
+    reset_timeout=config.get("breaker_reset_timeout", 10),
+    max_reset_timeout=config.get("breaker_max_reset_timeout", 120),
+)
+BREAKER_PROBE_INTERVAL = config.get("breaker_probe_interval", 1)
+
+# Caché en disco de los archivos retransmitidos desde otros peers
+proxy_cache = FileCache(
+    os.path.join(config.get("proxy_cache_dir", DIRECTORY.rstrip("/") + "_cache"), "grpc"),
+    max_bytes=config.get("proxy_cache_max_bytes", 1024 ** 3),
+    ttl=config.get("proxy_cache_ttl", 300),
+    policy=config.get("proxy_cache_policy", "lru"),
+)
+# Descargas por flooding en curso: los pedidos simultáneos del mismo archivo comparten una
+flights = FlightGroup(proxy_cache.temp_path)
+
+# Límites del servidor asyncio: RPCs a la vez (los que sobran reciben
+# RESOURCE_EXHAUSTED), streams por conexión HTTP/2 (sin límite si no se indica;
+# los que sobran se rechazan con REFUSED_STREAM) e hilos para el disco
+GRPC_MAX_CONCURRENT_RPCS = config.get("grpc_max_concurrent_rpcs", 1000)
+GRPC_MAX_STREAMS_PER_CONNECTION = config.get("grpc_max_streams_per_connection")
+GRPC_IO_THREADS = config.get("grpc_io_threads", 16)
+
+# Canales gRPC hacia los demás peers, reutilizados entre pedidos y con keepalive
+GRPC_KEEPALIVE_TIME = config.get("grpc_keepalive_time", 30)
+channel_pool = ChannelPool(
+    idle_timeout=config.get("grpc_channel_idle_timeout", 300),
+    keepalive_time=GRPC_KEEPALIVE_TIME,
+    keepalive_timeout=config.get("grpc_keepalive_timeout", 10),
+)
+CHANNEL_MAINTENANCE_INTERVAL = config.get("grpc_channel_maintenance_interval", 30)
+
+# Cliente HTTP compartido para hablar con el REST de los demás peers (se crea en serve)
+http_client: httpx.AsyncClient = None
 
-print(peer_files)
+# Tareas lanzadas en segundo plano (se guarda la referencia para que no se pierdan)
+_background_tasks = set()
+
+# Refresco de los catálogos de los peers: deadline para todos juntos y
+# tiempo mínimo entre refrescos (los pedidos que llegan antes usan el índice)
+PEER_REFRESH_DEADLINE = config.get("peer_refresh_deadline", 5)
+PEER_REFRESH_INTERVAL = config.get("peer_refresh_interval", 2)
+
+# Saltos máximos de una consulta de flooding y cuánto se recuerda un query_id
+FLOOD_TTL = config.get("flood_ttl", 3)
+SEEN_QUERY_TTL = config.get("seen_query_ttl", 60)
+
+# Carrera entre peers en el flooding: hasta FLOOD_HEDGE descargas a la vez,
+# sumando un peer nuevo cada FLOOD_HEDGE_DELAY segundos mientras ninguno
+# haya enviado el primer chunk (flood_hedge = 1 es probar de a uno)
+FLOOD_HEDGE = config.get("flood_hedge", 3)
+FLOOD_HEDGE_DELAY = config.get("flood_hedge_delay", 0.1)
+
+# Subidas por diferencias: tamaño de bloque de las firmas (0 = ~sqrt del tamaño del archivo)
+DELTA_BLOCK_SIZE = config.get("delta_block_size", 0)
+
+# Réplicas: copias de cada archivo subido, contando la local (1 = sin réplicas),
+# y cómo se eligen los peers: "hash" (hashing consistente) o "load" (los menos cargados)
+REPLICATION_FACTOR = config.get("replication_factor", 1)
+REPLICATION_STRATEGY = config.get("replication_strategy", "hash")
+
+# Consultas de flooding ya vistas: {query_id: instante en que se vio}
+_seen_queries = OrderedDict()
+_seen_lock = threading.Lock()
+
+def first_time_seen(query_id: str):
+    """Registra el query_id; devuelve False si ya se había visto (consulta duplicada)"""
+    now = time.monotonic()
+    with _seen_lock:
+        # Olvidar las consultas viejas (están en orden de llegada)
+        while _seen_queries and next(iter(_seen_queries.values())) < now - SEEN_QUERY_TTL:
+            _seen_queries.popitem(last=False)
+        if query_id in _seen_queries:
+            return False
+        _seen_queries[query_id] = now
+        return True
 
 class FileServiceServicer(grpc_pb2_grpc.FileServiceServicer):
 
-    def DownloadFile(self, request, context):
-        """Envía el archivo en chunks"""
+    async def DownloadFile(self, request, context):
+        """
+        Envía el archivo en chunks, solo la ventana [offset, offset + length)
+        si se pide un rango (length = 0 es hasta el final).
+        Si no está local hace flooding a los demás peers, sin repetir consultas
+        ya vistas y con un TTL que se descuenta en cada salto.
+        """
 
-        refresh_peers()
+        if request.offset < 0 or request.length < 0:
+            context.set_details("Invalid offset/length")
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            return
 
         file_path = os.path.join(DIRECTORY, request.filename)
         if os.path.exists(file_path):
-            chunk_size = 1024 * 64  # 64 KB
-            chunk_number = 0
-            with open(file_path, "rb") as f:
-                while chunk := f.read(chunk_size):
-                    yield grpc_pb2.FileChunk(
-                        filename=request.filename,
-                        content=chunk,
-                        chunk_number=chunk_number
-                    )
-                    chunk_number += 1
+            async for chunk in serve_file(file_path, None, request, context):
+                yield chunk
+            return
+        manifest = await asyncio.to_thread(chunk_store.manifest, request.filename) if chunk_store else None
+        if manifest is not None:
+            async for chunk in serve_stored(manifest, request, context):
+                yield chunk
+            return
+
+        # Copia guardada de una retransmisión anterior
+        cached = proxy_cache.get(request.filename)
+        if cached is not None:
+            async for chunk in serve_file(cached["path"], cached["version"], request, context):
+                yield chunk
             return
 
         # No está local → flooding a otros peers
+        # Una consulta sin query_id viene de un cliente: es el primer salto
+        query_id = request.query_id or uuid.uuid4().hex
+        ttl = request.ttl if request.query_id else FLOOD_TTL
 
-        for peer in config.get("peers", []):
-            try:
-                target = peer['url_grpc']
-                print(peer['url_grpc'])
-                with grpc.insecure_channel(target) as channel:
-                    stub = grpc_pb2_grpc.FileServiceStub(channel)
-                    response_stream = stub.DownloadFile(
-                        grpc_pb2.FileRequest(filename=request.filename),
-                        timeout=10
-                    )
-
-                    # Proxy: retransmitimos los chunks de ese peer
-                    for chunk in response_stream:
-                        yield chunk
-                    return  
-            except Exception as e:
-                # Si un peer falla, seguimos probando con el siguiente
-                continue
+        if not first_time_seen(query_id):
+            context.set_details("Duplicate query")
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            return
 
-        #  Ningún peer lo tiene
-        context.set_details("File not found in network")
-        context.set_code(grpc.StatusCode.NOT_FOUND)
-        return
+        if ttl <= 0:
+            context.set_details("File not found (TTL expired)")
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            return
 
-    def UploadFile(self, request_iterator, context):
-        """Recibe un archivo en chunks y lo guarda en DIRECTORY"""
+        await refresh_peers()
 
-        refresh_peers()
+        # Pedidos de un cliente por el archivo completo: los simultáneos comparten
+        # una sola transferencia (los saltos de flooding no, para no formar ciclos)
+        if not request.query_id and not request.offset and not request.length and not request.expected_version:
+            flight, reader, leader = flights.join(request.filename)
+            if leader:
+                spawn(run_flight(request, query_id, ttl, flight))
+            async for chunk in serve_flight(flight, reader, request, context):
+                yield chunk
+            return
+
+        try:
+            async for chunk in relay(request, query_id, ttl):
+                yield chunk
+        except RelayError as e:
+            context.set_details(e.details)
+            context.set_code(e.code)
+
+    async def UploadFile(self, request_iterator, context):
+        """
+        Recibe un archivo en chunks y lo guarda en DIRECTORY (o en el almacén
+        de chunks si storage_engine = "chunks").
+        Se arma en un temporal y se publica entero al final (ver StagedFile):
+        nadie descarga un archivo a medias y una subida que falla no pisa
+        la versión anterior.
+
+        Si el primer chunk trae replicate_to, cada chunk se reenvía al primero
+        de esos peers apenas llega (réplica en cadena) y se responden todos los
+        que guardaron el archivo. Una subida de un cliente (no una réplica)
+        se replica después en segundo plano si replication_factor > 1.
+        """
 
         filename = None
+        staged = None
+        expected_size = 0
+        received = 0
+        replica = False
+        queue = asyncio.Queue(maxsize=CHAIN_QUEUE_SIZE)
+        forward = None
         try:
-            for chunk in request_iterator:
+            async for chunk in request_iterator:
                 if filename is None:
                     filename = chunk.filename
-                    file_path = os.path.join(DIRECTORY, filename)
-                    f = open(file_path, "wb")  # abrir una vez
+                    replica = chunk.replica
+                    staged = await asyncio.to_thread(StagedFile, DIRECTORY, filename)  # abrir una vez
+                    if chunk.replicate_to:
+                        forward = asyncio.create_task(
+                            forward_replica(filename, list(chunk.replicate_to), chunk.file_size, queue)
+                        )
+
+                expected_size = chunk.file_size or expected_size
+                received += len(chunk.content)
+                await asyncio.to_thread(staged.write, chunk.content)
+                if forward is not None:
+                    await offer(queue, forward, chunk.content)
+
+            # Un cliente que cancela se ve primero como un fin de stream normal:
+            # si mandó file_size se confirma que el archivo llegó entero
+            if context.cancelled() or (expected_size and received != expected_size):
+                raise ValueError(f"Upload incomplete ({received} of {expected_size} bytes)")
+            if forward is not None:
+                await offer(queue, forward, None)
+            if staged is not None:
+                await asyncio.to_thread(staged.commit, chunk_store)
+
+            # Actualizar peer_files para que aparezca en /files (ya publicado)
+            replicas = []
+            if filename:
+                peer_files.touch(LOCAL_PEER_NAME, filename)
+                await asyncio.to_thread(proxy_cache.invalidate, [filename])
+                replicas.append(LOCAL_PEER_NAME)
+                if not replica and REPLICATION_FACTOR > 1:
+                    spawn(replicate(filename))
+            if forward is not None:
+                try:
+                    replicas += await forward
+                except Exception:
+                    pass  # la cadena se cortó más adelante: quien la inició reintenta con otros peers
 
-                f.write(chunk.content)
+            return grpc_pb2.UploadStatus(success=True, message="Upload complete", replicas=replicas)
 
-            if 'f' in locals() and not f.closed:
-                f.close()
+        except asyncio.CancelledError:
+            if forward is not None:
+                forward.cancel()
+            if staged is not None:
+                staged.abort()
+            raise
+        except Exception as e:
+            # El siguiente peer de la cadena ve la llamada cancelada y también descarta su copia
+            if forward is not None:
+                forward.cancel()
+            if staged is not None:
+                await asyncio.to_thread(staged.abort)
+            return grpc_pb2.UploadStatus(success=False, message=str(e))
+
+    async def GetCatalogSummary(self, request, context):
+        """
+        Publica un filtro de Bloom con los archivos locales, desde el índice
+        (lo mantienen al día las subidas y cada refresco de catálogos)
+        """
+
+        version, bloom = local_summary()
+        return grpc_pb2.CatalogSummary(
+            peer=LOCAL_PEER_NAME,
+            version=version,
+            num_bits=bloom.num_bits,
+            num_hashes=bloom.num_hashes,
+            bits=bytes(bloom.bits)
+        )
+
+    async def Locate(self, request_iterator, context):
+        """
+        Localiza muchos archivos a la vez. Primero junta todos los nombres,
+        sincroniza los catálogos una sola vez (una petición por peer)
+        y responde desde el índice.
+        """
+
+        filenames = list(dict.fromkeys([req.filename async for req in request_iterator]))
+        await refresh_peers()
+
+        peers = {peer["name"]: peer for peer in remote_peers()}
+        for filename in filenames:
+            sources = []
+            for name in sorted(peer_files.peers_with(filename), key=lambda n: n != LOCAL_PEER_NAME):
+                if name == LOCAL_PEER_NAME:
+                    peer = {"url": config.get("url", ""), "url_grpc": config.get("url_grpc", "")}
+                elif name in peers:
+                    peer = peers[name]
+                else:
+                    continue
+                sources.append(grpc_pb2.FileSource(
+                    peer=name,
+                    download_url=f"{peer['url']}/download/{filename}",
+                    url_grpc=peer.get("url_grpc") or ""
+                ))
+            yield grpc_pb2.LocateResult(filename=filename, found=bool(sources), sources=sources)
+
+    async def LocateStream(self, request, context):
+        """
+        Localiza un archivo y envía cada fuente apenas se confirma:
+        primero la local y luego los peers remotos, consultados en paralelo.
+        """
+
+        filename = request.filename
+        limit = request.max_sources if request.max_sources > 0 else None  # 0 o menos: todas
+        sent = 0
+
+        if await asyncio.to_thread(is_local, filename):
+            yield grpc_pb2.FileSource(
+                peer=LOCAL_PEER_NAME,
+                download_url=f"{config.get('url', '')}/download/{filename}",
+                url_grpc=config.get("url_grpc", "")
+            )
+            sent += 1
+            if limit and sent >= limit:
+                return
+
+        async def has_file(peer):
+            start = time.monotonic()
+            try:
+                resp = await http_client.get(f"{peer['url']}/has", params={"filename": filename})
+                resp.raise_for_status()
+            except httpx.HTTPError as e:
+                peer_stats.record_failure(peer["name"])
+                breaker_record(peer["name"], e)
+                raise
+            peer_stats.record_success(peer["name"], rtt=time.monotonic() - start)
+            breaker.record_success(peer["name"])
+            return peer, resp.json().get("found", False)
+
+        peers = [peer for peer in remote_peers() if breaker.allow(peer["name"])]
+        pending = [asyncio.create_task(has_file(peer)) for peer in peers]
+        try:
+            for done in asyncio.as_completed(pending):
+                try:
+                    peer, found = await done
+                except Exception:
+                    continue
+                if not found:
+                    continue
+                yield grpc_pb2.FileSource(
+                    peer=peer["name"],
+                    download_url=f"{peer['url']}/download/{filename}",
+                    url_grpc=peer.get("url_grpc") or ""
+                )
+                sent += 1
+                if limit and sent >= limit:
+                    return
+        finally:
+            # No esperar a los peers lentos si ya se cortó el stream
+            for task in pending:
+                task.cancel()
+
+    async def GetSignatures(self, request, context):
+        """
+        Envía en tandas las firmas por bloque (checksum rodante + hash fuerte)
+        de la versión local del archivo, para que quien lo vuelve a subir
+        mande solo las diferencias con UploadDelta.
+        """
+
+        base = await asyncio.to_thread(open_local, request.filename)
+        if base is None:
+            context.set_details("File not found")
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            return
+        f, size, version = base
+        try:
+            block_size = pick_block_size(size, request.block_size or DELTA_BLOCK_SIZE)
+            signatures = iter_signatures(f, block_size)
+            while True:
+                batch = await asyncio.to_thread(take, signatures, SIGNATURE_BATCH)
+                yield grpc_pb2.BlockSignatures(
+                    version=version,
+                    file_size=size,
+                    block_size=block_size,
+                    weak=[weak for weak, _ in batch],
+                    strong=[strong for _, strong in batch]
+                )
+                if len(batch) < SIGNATURE_BATCH:
+                    break
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def UploadDelta(self, request_iterator, context):
+        """
+        Recibe una versión nueva de un archivo como diferencias sobre la
+        versión local (bloques que se copian de ella + datos nuevos) y la arma
+        en un StagedFile, como UploadFile. Si la versión local ya no es la de
+        las firmas (base_version) o el resultado no coincide con el tamaño y el
+        sha256 anunciados, se descarta y la versión local queda como estaba.
+        """
 
-            # Actualizar peer_files para que aparezca en /files
-            if filename and filename not in peer_files[LOCAL_PEER_NAME]:
-                peer_files[LOCAL_PEER_NAME].append(filename)
+        base = None
+        staged = None
+        decoder = None
+        try:
+            async for chunk in request_iterator:
+                if decoder is None:
+                    base = await asyncio.to_thread(open_local, chunk.filename)
+                    if base is None or base[2] != chunk.base_version:
+                        raise DeltaError("Base version changed, upload the whole file")
+                    staged = await asyncio.to_thread(StagedFile, DIRECTORY, chunk.filename)
+                    decoder = DeltaDecoder(base[0], base[1], chunk.block_size, staged)
+                await asyncio.to_thread(decoder.apply, chunk)
 
-            return grpc_pb2.UploadStatus(success=True, message="Upload complete")
+            # Un stream cortado no trae el tamaño y el sha256 finales: finish() lo rechaza
+            if decoder is None:
+                raise DeltaError("Empty upload")
+            await asyncio.to_thread(decoder.finish)
+            await asyncio.to_thread(staged.commit, chunk_store)
 
+            peer_files.touch(LOCAL_PEER_NAME, staged.filename)
+            await asyncio.to_thread(proxy_cache.invalidate, [staged.filename])
+            if REPLICATION_FACTOR > 1:
+                spawn(replicate(staged.filename))
+            return grpc_pb2.UploadStatus(
+                success=True,
+                message=f"Delta applied ({decoder.literal_bytes} new bytes, {decoder.copied_bytes} reused)"
+            )
+
+        except asyncio.CancelledError:
+            if staged is not None:
+                staged.abort()
+            raise
         except Exception as e:
+            if staged is not None:
+                await asyncio.to_thread(staged.abort)
             return grpc_pb2.UploadStatus(success=False, message=str(e))
+        finally:
+            if base is not None:
+                base[0].close()
+
+class RelayError(Exception):
+    """Ningún peer pudo enviar la ventana pedida; code y details van al cliente"""
+
+    def __init__(self, code, details: str):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+async def relay(request, query_id: str, ttl: int):
+    """
+    Flooding: pedir la ventana del archivo a los demás peers y retransmitir
+    los chunks del primero que la tenga.
+    Lanza RelayError si ningún peer pudo enviarla completa.
+    """
+
+    # Los peers a los que este nodo va a preguntar también cuentan como
+    # visitados: así los siguientes saltos no se los vuelven a preguntar.
+    # Los peers con el circuito abierto se saltan directamente.
+    targets = [
+        peer for peer in remote_peers()
+        if peer.get("url_grpc") and peer.get("name") not in request.visited
+        and breaker.allow(peer.get("name"))
+    ]
+    visited = list(request.visited) + [LOCAL_PEER_NAME] + [peer.get("name") for peer in targets]
+
+    # Ventana pendiente: si un peer se corta a mitad, el siguiente
+    # continúa desde donde quedó y solo si tiene la misma versión
+    offset, length, expected_version = request.offset, request.length, request.expected_version
+    # Peers que ya no sirven para esta consulta: {nombre: (código, detalle) si
+    # tiene el archivo pero no la versión o el rango pedidos, o None}
+    tried = {}
+
+    def window_request():
+        return grpc_pb2.FileRequest(
+            filename=request.filename,
+            query_id=query_id,
+            ttl=ttl - 1,
+            visited=visited,
+            offset=offset,
+            length=length,
+            expected_version=expected_version
+        )
+
+    # Probar primero los peers más rápidos según sus estadísticas
+    ranked = peer_stats.rank(targets, key=lambda peer: peer.get("name"))
+    while True:
+        if request.length and length <= 0:
+            return  # la ventana pedida ya se envió completa
+        winner = await race_peers([p for p in ranked if p.get("name") not in tried], window_request, tried)
+        if winner is None:
+            break
+        peer, response_stream, chunk, start = winner
+        rtt = time.monotonic() - start
+        nbytes = 0
+
+        # Proxy: retransmitimos los chunks de ese peer
+        try:
+            while chunk is not grpc.aio.EOF:
+                nbytes += len(chunk.content)
+                offset = chunk.offset + len(chunk.content)
+                if length:
+                    length = request.offset + request.length - offset
+                expected_version = chunk.version
+                yield chunk
+                chunk = await response_stream.read()
+        except Exception as e:
+            # Se cortó a mitad: el siguiente peer continúa desde offset
+            record_miss(peer, e, start, tried)
+            continue
+        finally:
+            # El canal sigue abierto: cortar la llamada si el cliente dejó de leer
+            response_stream.cancel()
+        peer_stats.record_success(
+            peer.get("name"), rtt=rtt, nbytes=nbytes, seconds=time.monotonic() - start
+        )
+        breaker.record_success(peer.get("name"))
+        return
+
+    mismatch = next((status for status in tried.values() if status), None)
+    if mismatch is not None:
+        # Alguien tiene el archivo, pero no la versión o el rango pedidos
+        raise RelayError(*mismatch)
+
+    #  Ningún peer lo tiene
+    raise RelayError(grpc.StatusCode.NOT_FOUND, "File not found in network")
+
+async def race_peers(peers, make_request, tried: dict):
+    """
+    Pedir la descarga a varios peers a la vez y quedarse con el primero que
+    envía un chunk; las demás llamadas se cancelan.
+    Arranca con el primero de peers y suma el siguiente cada FLOOD_HEDGE_DELAY
+    segundos sin respuesta, o apenas uno no tiene el archivo, con hasta
+    FLOOD_HEDGE llamadas en curso.
+    Devuelve (peer, llamada, primer chunk, inicio) o None si ninguno lo envió;
+    los que fallaron o no lo tienen quedan anotados en tried.
+    El primer chunk es grpc.aio.EOF si el archivo (o la ventana) está vacío.
+    """
+    candidates = iter(peers)
+    next_peer = next(candidates, None)
+    racing = {}  # {lectura del primer chunk: (peer, llamada, inicio)}
+    try:
+        while racing or next_peer is not None:
+            if next_peer is not None and len(racing) < FLOOD_HEDGE:
+                peer, next_peer = next_peer, next(candidates, None)
+                print(peer['url_grpc'])
+                start = time.monotonic()
+                try:
+                    channel = await channel_pool.get(peer['url_grpc'])
+                    call = grpc_pb2_grpc.FileServiceStub(channel).DownloadFile(make_request(), timeout=10)
+                except Exception as e:
+                    record_miss(peer, e, start, tried)
+                    continue
+                racing[asyncio.ensure_future(call.read())] = (peer, call, start)
+
+            hedge = next_peer is not None and len(racing) < FLOOD_HEDGE
+            done, _ = await asyncio.wait(
+                racing, timeout=FLOOD_HEDGE_DELAY if hedge else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                peer, call, start = racing.pop(task)
+                try:
+                    return peer, call, task.result(), start
+                except Exception as e:
+                    record_miss(peer, e, start, tried)
+        return None
+    finally:
+        for task, (peer, call, start) in racing.items():
+            call.cancel()
+            task.cancel()
+
+def record_miss(peer, error, start, tried: dict):
+    """Anotar un peer que no envió el archivo, distinguiendo "no lo tiene" de una falla"""
+    name = peer.get("name")
+    tried[name] = None
+    if not isinstance(error, grpc.RpcError):
+        return
+    if error.code() in (grpc.StatusCode.NOT_FOUND, grpc.StatusCode.FAILED_PRECONDITION, grpc.StatusCode.OUT_OF_RANGE):
+        # El peer respondió bien, solo que no tiene el archivo (o esa versión / ese rango)
+        peer_stats.record_success(name, rtt=time.monotonic() - start)
+        breaker.record_success(name)
+        if error.code() != grpc.StatusCode.NOT_FOUND:
+            tried[name] = (error.code(), error.details())
+    else:
+        peer_stats.record_failure(name)
+        breaker.record_failure(name)
+
+def breaker_record(name: str, error: Exception):
+    """
+    Registrar un error HTTP en el circuit breaker del peer.
+    Un 4xx significa que el peer está vivo y respondió: no abre el circuito.
+    """
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500:
+        breaker.record_success(name)
+    else:
+        breaker.record_failure(name)
+
+async def run_flight(request, query_id: str, ttl: int, flight: Flight):
+    """Bombear el archivo, traído por flooding, al spool de la transferencia compartida"""
+    error = "Transfer interrupted"
+    try:
+        status = None
+        try:
+            async for chunk in relay(request, query_id, ttl):
+                if flight.meta is None:
+                    flight.start(status=None, version=chunk.version, file_size=chunk.file_size)
+                await flight.write(chunk.content)
+        except RelayError as e:
+            status = (e.code, e.details)
+
+        if status is None:
+            if flight.meta is None:
+                flight.start(status=None, version="", file_size=0)  # archivo vacío
+            error = None
+        elif flight.meta is None:
+            flight.start(status=status)  # nadie lo tiene: se informa a todos los que esperan
+            error = None
+        else:
+            error = status[1]  # se cortó a mitad y nadie pudo continuar
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    finally:
+        flight.finish(error)
+        flights.leave(request.filename, flight)
+
+        # Los lectores ya tienen el spool abierto: se puede mover a la caché o
+        # borrar (también si la tarea se canceló)
+        if error is None and flight.meta["status"] is None and proxy_cache.fits(flight.size):
+            proxy_cache.add(request.filename, flight.path, flight.size, version=flight.meta["version"])
+        else:
+            os.remove(flight.path)
 
-def refresh_peers():
+async def serve_flight(flight: Flight, reader, request, context):
+    """Enviar en chunks lo que la transferencia compartida va escribiendo en el spool"""
+    meta = await flight.wait_ready()
+    if meta is None or meta["status"] is not None:
+        reader.close()
+        code, details = meta["status"] if meta else (grpc.StatusCode.UNAVAILABLE, flight.error)
+        context.set_details(details)
+        context.set_code(code)
+        return
+
+    chunk_number = 0
+    offset = 0
+    try:
+        async for data in flight.read(reader):
+            yield grpc_pb2.FileChunk(
+                filename=request.filename,
+                content=data,
+                chunk_number=chunk_number,
+                offset=offset,
+                file_size=meta["file_size"],
+                version=meta["version"]
+            )
+            offset += len(data)
+            chunk_number += 1
+    except FlightError as e:
+        context.set_details(str(e))
+        context.set_code(grpc.StatusCode.UNAVAILABLE)
+
+async def serve_file(file_path, version, request, context):
     """
-    Refresca los archivos de todos los peers conocidos.
+    Envía en chunks la ventana pedida de un archivo en disco (leído en el pool de hilos).
+    Sin version se toma la del archivo abierto: si una subida lo reemplaza
+    mientras tanto, el tamaño y la versión siguen correspondiendo a lo que se lee.
     """
+    f = await asyncio.to_thread(open, file_path, "rb")
+    try:
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        version = version or file_version(stat)
+        if not check_window(size, version, request, context):
+            return
+
+        end = size if not request.length else min(size, request.offset + request.length)
+        chunk_size = 1024 * 64  # 64 KB
+        chunk_number = 0
+        position = request.offset
+        f.seek(position)
+        while position < end and (chunk := await asyncio.to_thread(f.read, min(chunk_size, end - position))):
+            yield grpc_pb2.FileChunk(
+                filename=request.filename,
+                content=chunk,
+                chunk_number=chunk_number,
+                offset=position,
+                file_size=size,
+                version=version
+            )
+            position += len(chunk)
+            chunk_number += 1
+    finally:
+        f.close()
+
+async def serve_stored(manifest, request, context):
+    """
+    Envía en chunks la ventana pedida de un archivo del almacén de chunks,
+    rearmándolo de a un chunk del almacén por vez (leído en el pool de hilos).
+    La versión es la del manifiesto.
+    """
+    size = manifest["size"]
+    version = manifest["version"]
+    if not check_window(size, version, request, context):
+        return
 
-    global config
-    # Recargar la configuración del JSON cada vez que se refrescan peers
-    config = load_config(CONFIG_PATH)
+    end = size if not request.length else min(size, request.offset + request.length)
+    pieces = chunk_store.read(manifest, request.offset, end - request.offset)
+    chunk_size = 1024 * 64  # 64 KB, como serve_file
+    chunk_number = 0
+    position = request.offset
+    while (piece := await asyncio.to_thread(next, pieces, None)) is not None:
+        for start in range(0, len(piece), chunk_size):
+            chunk = piece[start:start + chunk_size]
+            yield grpc_pb2.FileChunk(
+                filename=request.filename,
+                content=chunk,
+                chunk_number=chunk_number,
+                offset=position,
+                file_size=size,
+                version=version
+            )
+            position += len(chunk)
+            chunk_number += 1
 
+def check_window(size, version, request, context):
+    """Validar expected_version y offset del pedido; si no sirven deja el error en context"""
+    if request.expected_version and request.expected_version != version:
+        context.set_details(f"File changed (version {version})")
+        context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
+        return False
+    if request.offset > size:
+        context.set_details(f"Offset past end of file ({size} bytes)")
+        context.set_code(grpc.StatusCode.OUT_OF_RANGE)
+        return False
+    return True
 
-    # 1. Actualizar archivos locales
-    peer_files[LOCAL_PEER_NAME] = [
-        f for f in os.listdir(DIRECTORY) if os.path.isfile(os.path.join(DIRECTORY, f))
+def file_version(stat):
+    """Versión de un archivo local (tamaño y fecha de modificación), como un ETag"""
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+# Último filtro de Bloom calculado para el catálogo local: (version, filtro)
+_local_summary = (None, None)
+
+def local_summary():
+    """Devuelve (version, filtro) del catálogo local, recalculando solo si cambió"""
+    global _local_summary
+    version = peer_files.version(LOCAL_PEER_NAME)
+    if _local_summary[0] != version:
+        _local_summary = (version, BloomFilter.from_items(peer_files.files_of(LOCAL_PEER_NAME)))
+    return _local_summary
+
+# Refresco en curso y cuándo terminó el último
+_refresh_task = None
+_last_refresh = float("-inf")
+
+# Vista de membresía (gossip) del servidor REST local: {nombre: miembro con
+# url, url_grpc, version y status}. None si no se pudo leer
+_members = None
+
+def remote_peers():
+    """
+    Peers remotos vivos según el gossip del servidor REST local; si todavía
+    no hay vista (o el REST no responde), los de la configuración
+    """
+    if _members is None:
+        return [p for p in config.get("peers", []) if p.get("name") and p.get("url")]
+    return [
+        m for m in _members.values()
+        if m.get("name") and m.get("url") and m["name"] != LOCAL_PEER_NAME and m.get("status") != "dead"
     ]
 
-    # 2. Actualizar info de los peers remotos
-    for peer in config.get("peers", []):
+async def load_members():
+    """Traer la vista de membresía del servidor REST local (GET /members)"""
+    global _members
+    try:
+        resp = await http_client.get(f"{config.get('url', '')}/members")
+        resp.raise_for_status()
+        _members = resp.json()["members"]
+    except (httpx.HTTPError, ValueError, KeyError):
+        _members = None
+
+async def refresh_peers():
+    """
+    Refresca los archivos de los peers vivos cuyo catálogo cambió.
+    Los pedidos simultáneos esperan el mismo refresco, y si el último terminó
+    hace menos de PEER_REFRESH_INTERVAL segundos no se repite.
+    """
+
+    global _refresh_task
+    if _refresh_task is None:
+        if time.monotonic() - _last_refresh < PEER_REFRESH_INTERVAL:
+            return
+        _refresh_task = asyncio.create_task(_refresh_all())
+    # shield: si se cancela un pedido, el refresco sigue para los demás
+    await asyncio.shield(_refresh_task)
+
+async def _refresh_all():
+    global config, _refresh_task, _last_refresh
+    try:
+        # Recargar la configuración del JSON en cada refresco
+        config = await asyncio.to_thread(load_config, CONFIG_PATH)
+
+        # 1. Actualizar archivos locales
+        peer_files.replace_peer(LOCAL_PEER_NAME, await asyncio.to_thread(local_files))
+
+        # 2. Actualizar info de los peers remotos, todos a la vez y con un deadline global.
+        # Solo los vivos según el gossip y cuya versión anunciada no es la que ya
+        # tiene el índice (sin vista de membresía se pregunta a todos)
+        await load_members()
+        peers = [
+            peer for peer in remote_peers()
+            # circuito abierto: lo sondea probe_loop
+            if breaker.allow(peer["name"])
+            and (peer.get("version") is None or peer["version"] != peer_files.version(peer["name"]))
+        ]
+        tasks = {asyncio.create_task(sync_catalog(peer)): peer for peer in peers}
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=PEER_REFRESH_DEADLINE)
+        for task in pending:
+            # Quien no respondió antes del deadline cuenta como fallo
+            task.cancel()
+            peer_stats.record_failure(tasks[task]["name"])
+            breaker.record_failure(tasks[task]["name"])
+        for task in done:
+            task.exception()  # ignorar peers que no respondan
+    finally:
+        _refresh_task = None
+        _last_refresh = time.monotonic()
+
+async def sync_catalog(peer):
+    """Traer los cambios del catálogo de un peer desde la última versión conocida"""
+    since = peer_files.version(peer["name"])
+    headers = {"If-None-Match": f'"v{since}"'} if since is not None else {}
+    start = time.monotonic()
+    try:
+        resp = await http_client.get(f"{peer['url']}/files", params={"since": since or 0}, headers=headers)
+    except httpx.HTTPError:
+        peer_stats.record_failure(peer["name"])
+        breaker.record_failure(peer["name"])
+        raise
+    peer_stats.record_success(peer["name"], rtt=time.monotonic() - start)
+    breaker.record_success(peer["name"])
+    if resp.status_code == 200:
+        data = resp.json()
+        if data["full"]:
+            peer_files.replace_peer(peer["name"], data["files"], data["version"])
+            # La lista completa no dice qué cambió de contenido: ninguna copia cacheada es segura
+            await asyncio.to_thread(proxy_cache.invalidate, data["files"])
+        else:
+            peer_files.apply_changes(peer["name"], data["added"], data["removed"], data["version"])
+            await asyncio.to_thread(proxy_cache.invalidate, data["added"] + data["removed"])
+
+async def probe_loop():
+    """Sondear en segundo plano los peers con el circuito abierto hasta que vuelvan"""
+    while True:
+        await asyncio.sleep(BREAKER_PROBE_INTERVAL)
+        for name in breaker.due_for_probe():
+            known = list((_members or {}).values()) + config.get("peers", [])
+            peer = next((p for p in known if p.get("name") == name and p.get("url")), None)
+            if peer is None:
+                breaker.record_failure(name)
+                continue
+            try:
+                if peer.get("url_grpc"):
+                    # Basta con que el canal del pool llegue a conectarse
+                    if not await channel_pool.check(peer["url_grpc"]):
+                        raise ConnectionError(peer["url_grpc"])
+                else:
+                    (await http_client.get(f"{peer['url']}/")).raise_for_status()
+            except Exception:
+                breaker.record_failure(name)
+            else:
+                breaker.record_success(name)
+
+async def channel_maintenance_loop():
+    """Cerrar periódicamente los canales gRPC ociosos o rotos"""
+    while True:
+        await asyncio.sleep(CHANNEL_MAINTENANCE_INTERVAL)
+        await channel_pool.maintain()
+
+def local_files():
+    """Archivos de la carpeta compartida y del almacén de chunks"""
+    files = [f for f in os.listdir(DIRECTORY) if os.path.isfile(os.path.join(DIRECTORY, f))]
+    if chunk_store is not None:
+        files += chunk_store.files()
+    return files
+
+# ----------------- Réplicas -----------------
+async def replicate(filename):
+    """
+    Copiar un archivo recién subido a REPLICATION_FACTOR - 1 peers más y
+    traer el catálogo de los que lo guardaron, así se ofrecen como fuentes y
+    las descargas se reparten entre ellas.
+    El archivo se manda una sola vez, al primer peer de la cadena. Si la
+    cadena se corta, se reintenta una vez con otros peers para las que faltan.
+    """
+    peers = [p for p in remote_peers() if p.get("url_grpc")]
+    stored = []
+    tried = set()
+    for _ in range(2):
+        candidates = [p for p in peers if p["name"] not in tried and breaker.allow(p["name"])]
+        targets = pick_replicas(
+            filename, candidates, REPLICATION_FACTOR - 1 - len(stored), REPLICATION_STRATEGY,
+            rank=lambda ps: peer_stats.rank(ps, key=lambda p: p["name"])
+        )
+        if not targets:
+            break
         try:
-            url = f"http://{peer['url']}/files"
-            resp = requests.get(url, timeout=5)
-            if resp.status_code == 200:
-                remote_files = resp.json().get("peer_files", {}).get(peer["name"], [])
-                peer_files[peer["name"]] = remote_files
-        except Exception:
-            continue  # ignorar peers que no respondan
+            replicas = await push_replica(filename, targets)
+        except Exception as e:
+            print(f"No se pudo replicar {filename} en {targets[0]['name']}: {e}")
+            breaker.record_failure(targets[0]["name"])
+            replicas = []
+        # Los peers de la cadena después del que falló no recibieron nada: pueden volver a elegirse
+        tried.update(p["name"] for p in targets[:len(replicas) + 1])
+        stored += replicas
+        if len(stored) >= REPLICATION_FACTOR - 1:
+            break
+    # Cada réplica registra el archivo con su propia versión de catálogo:
+    # se trae su delta en vez de tocar a mano la entrada de otro peer
+    await asyncio.gather(
+        *(sync_catalog(p) for p in peers if p["name"] in stored and p.get("url")), return_exceptions=True
+    )
+    return stored
+
+async def push_replica(filename, targets):
+    """Mandar el archivo local por UploadFile al primero de targets, con el resto como cadena"""
+    base = await asyncio.to_thread(open_local, filename)
+    if base is None:
+        return []
+    f, size, _ = base
+
+    async def chunks():
+        chunk_size = 1024 * 64  # 64 KB
+        try:
+            content = await asyncio.to_thread(f.read, chunk_size)
+            yield grpc_pb2.FileChunk(
+                filename=filename, content=content, file_size=size, replica=True,
+                replicate_to=[p["url_grpc"] for p in targets[1:]]
+            )
+            while content := await asyncio.to_thread(f.read, chunk_size):
+                yield grpc_pb2.FileChunk(content=content)
+        finally:
+            await asyncio.to_thread(f.close)
+
+    stub = await replica_stub(targets[0]["url_grpc"])
+    status = await stub.UploadFile(chunks())
+    if not status.success:
+        raise RuntimeError(status.message)
+    return list(status.replicas)
+
+async def forward_replica(filename, chain, file_size, queue):
+    """Reenviar por UploadFile al siguiente peer de la cadena los chunks que llegan por queue"""
+
+    async def chunks():
+        first = True
+        async for content in queue_items(queue):
+            if first:
+                yield grpc_pb2.FileChunk(
+                    filename=filename, content=content, file_size=file_size, replica=True, replicate_to=chain[1:]
+                )
+                first = False
+            else:
+                yield grpc_pb2.FileChunk(content=content)
+        if first:  # archivo vacío
+            yield grpc_pb2.FileChunk(filename=filename, replica=True, replicate_to=chain[1:])
+
+    stub = await replica_stub(chain[0])
+    status = await stub.UploadFile(chunks())
+    if not status.success:
+        raise RuntimeError(status.message)
+    return list(status.replicas)
+
+async def replica_stub(target):
+    """Stub hacia target, fallando enseguida si no conecta (sin esperar el timeout de TCP)"""
+    if not await channel_pool.check(target):
+        raise ConnectionError(f"{target} unreachable")
+    return grpc_pb2_grpc.FileServiceStub(await channel_pool.get(target))
+
+def open_local(filename):
+    """
+    Abrir para leer la versión local de filename: (archivo, tamaño, versión),
+    o None si no está en la carpeta compartida ni en el almacén de chunks
+    """
+    try:
+        f = open(os.path.join(DIRECTORY, filename), "rb")
+    except (FileNotFoundError, IsADirectoryError):
+        f = None
+    if f is not None:
+        stat = os.fstat(f.fileno())
+        return f, stat.st_size, file_version(stat)
+    stored = chunk_store.open(filename) if chunk_store is not None else None
+    if stored is None:
+        return None
+    return stored, stored.manifest["size"], stored.manifest["version"]
+
+def is_local(filename):
+    """True si el archivo está en la carpeta compartida o en el almacén de chunks"""
+    if os.path.exists(os.path.join(DIRECTORY, filename)):
+        return True
+    return chunk_store is not None and chunk_store.manifest(filename) is not None
+
+def spawn(coro):
+    """Lanzar una tarea en segundo plano guardando la referencia"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 # ----------------- Servidor gRPC -----------------
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+async def serve():
+    """
+    Servidor asyncio: cada transferencia es una corrutina, no un hilo, así que
+    los streams simultáneos los limita GRPC_MAX_CONCURRENT_RPCS y no el pool.
+    """
+    global http_client
+    # Solo el disco usa hilos
+    asyncio.get_running_loop().set_default_executor(futures.ThreadPoolExecutor(max_workers=GRPC_IO_THREADS))
+    http_client = httpx.AsyncClient(
+        timeout=5,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+
+    # Aceptar los pings de keepalive de los pools de los demás peers
+    options = server_keepalive_options(GRPC_KEEPALIVE_TIME)
+    if GRPC_MAX_STREAMS_PER_CONNECTION:
+        options.append(("grpc.max_concurrent_streams", GRPC_MAX_STREAMS_PER_CONNECTION))
+    server = grpc.aio.server(maximum_concurrent_rpcs=GRPC_MAX_CONCURRENT_RPCS, options=options)
     grpc_pb2_grpc.add_FileServiceServicer_to_server(FileServiceServicer(), server)
     grpc_port = 50050
     server.add_insecure_port(f"[::]:{grpc_port}")
     print(f"gRPC server listening on port {grpc_port}...")
-    server.start()
-    server.wait_for_termination()
+    await server.start()
+    spawn(probe_loop())
+    spawn(channel_maintenance_loop())
+    try:
+        await server.wait_for_termination()
+    finally:
+        await channel_pool.close_all()
+        await http_client.aclose()
 
 
 if __name__ == "__main__":
-    serve()
+    asyncio.run(serve())
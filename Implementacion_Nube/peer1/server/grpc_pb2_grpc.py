@@ -44,6 +44,31 @@ class FileServiceStub(object):
                 request_serializer=grpc__pb2.FileChunk.SerializeToString,
                 response_deserializer=grpc__pb2.UploadStatus.FromString,
                 _registered_method=True)
+        self.GetCatalogSummary = channel.unary_unary(
+                '/file_service.FileService/GetCatalogSummary',
+                request_serializer=grpc__pb2.SummaryRequest.SerializeToString,
+                response_deserializer=grpc__pb2.CatalogSummary.FromString,
+                _registered_method=True)
+        self.Locate = channel.stream_stream(
+                '/file_service.FileService/Locate',
+                request_serializer=grpc__pb2.LocateRequest.SerializeToString,
+                response_deserializer=grpc__pb2.LocateResult.FromString,
+                _registered_method=True)
+        self.LocateStream = channel.unary_stream(
+                '/file_service.FileService/LocateStream',
+                request_serializer=grpc__pb2.LocateStreamRequest.SerializeToString,
+                response_deserializer=grpc__pb2.FileSource.FromString,
+                _registered_method=True)
+        self.GetSignatures = channel.unary_stream(
+                '/file_service.FileService/GetSignatures',
+                request_serializer=grpc__pb2.SignatureRequest.SerializeToString,
+                response_deserializer=grpc__pb2.BlockSignatures.FromString,
+                _registered_method=True)
+        self.UploadDelta = channel.stream_unary(
+                '/file_service.FileService/UploadDelta',
+                request_serializer=grpc__pb2.DeltaChunk.SerializeToString,
+                response_deserializer=grpc__pb2.UploadStatus.FromString,
+                _registered_method=True)
 
 
 class FileServiceServicer(object):
@@ -63,6 +88,41 @@ class FileServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetCatalogSummary(self, request, context):
+        """Resumen compacto (filtro de Bloom) de los archivos locales
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Locate(self, request_iterator, context):
+        """Localiza muchos archivos a la vez: recibe los nombres y devuelve un resultado por cada uno
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def LocateStream(self, request, context):
+        """Localiza un archivo enviando cada fuente apenas un peer la confirma
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetSignatures(self, request, context):
+        """Firmas por bloque de la versión local de un archivo (base para UploadDelta)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def UploadDelta(self, request_iterator, context):
+        """Sube una versión nueva de un archivo que el peer ya tiene mandando solo las diferencias (estilo rsync)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_FileServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -76,6 +136,31 @@ def add_FileServiceServicer_to_server(servicer, server):
                     request_deserializer=grpc__pb2.FileChunk.FromString,
                     response_serializer=grpc__pb2.UploadStatus.SerializeToString,
             ),
+            'GetCatalogSummary': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetCatalogSummary,
+                    request_deserializer=grpc__pb2.SummaryRequest.FromString,
+                    response_serializer=grpc__pb2.CatalogSummary.SerializeToString,
+            ),
+            'Locate': grpc.stream_stream_rpc_method_handler(
+                    servicer.Locate,
+                    request_deserializer=grpc__pb2.LocateRequest.FromString,
+                    response_serializer=grpc__pb2.LocateResult.SerializeToString,
+            ),
+            'LocateStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.LocateStream,
+                    request_deserializer=grpc__pb2.LocateStreamRequest.FromString,
+                    response_serializer=grpc__pb2.FileSource.SerializeToString,
+            ),
+            'GetSignatures': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetSignatures,
+                    request_deserializer=grpc__pb2.SignatureRequest.FromString,
+                    response_serializer=grpc__pb2.BlockSignatures.SerializeToString,
+            ),
+            'UploadDelta': grpc.stream_unary_rpc_method_handler(
+                    servicer.UploadDelta,
+                    request_deserializer=grpc__pb2.DeltaChunk.FromString,
+                    response_serializer=grpc__pb2.UploadStatus.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'file_service.FileService', rpc_method_handlers)
@@ -139,4 +224,139 @@ class FileService(object):
             wait_for_ready,
             timeout,
             metadata,
-            _registered_method=True)
\ No newline at end of file
+            _registered_method=True)
+
+    @staticmethod
+    def GetCatalogSummary(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/file_service.FileService/GetCatalogSummary',
+            grpc__pb2.SummaryRequest.SerializeToString,
+            grpc__pb2.CatalogSummary.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Locate(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/file_service.FileService/Locate',
+            grpc__pb2.LocateRequest.SerializeToString,
+            grpc__pb2.LocateResult.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def LocateStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/file_service.FileService/LocateStream',
+            grpc__pb2.LocateStreamRequest.SerializeToString,
+            grpc__pb2.FileSource.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetSignatures(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/file_service.FileService/GetSignatures',
+            grpc__pb2.SignatureRequest.SerializeToString,
+            grpc__pb2.BlockSignatures.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def UploadDelta(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/file_service.FileService/UploadDelta',
+            grpc__pb2.DeltaChunk.SerializeToString,
+            grpc__pb2.UploadStatus.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+# --------- Estadísticas de salud por peer ----------
+class PeerStats:
+    """
+    Promedios móviles exponenciales (EWMA) por peer de:
+    - rtt: segundos hasta la respuesta (o el primer byte en una transferencia)
+    - throughput: bytes por segundo en transferencias
+    - error_rate: fracción de llamadas fallidas
+    Con ellos se estima el costo de usar cada peer y se ordenan las fuentes.
+    """
+
+    def __init__(self, alpha: float = 0.3, reference_bytes: int = 1024 * 1024, min_transfer_bytes: int = 64 * 1024):
+        self.alpha = alpha
+        # Tamaño de referencia para estimar el costo de transferir desde un peer
+        self.reference_bytes = reference_bytes
+        # Transferencias más chicas no dicen nada útil sobre la velocidad
+        self.min_transfer_bytes = min_transfer_bytes
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record_success(self, peer: str, rtt: float = None, nbytes: int = None, seconds: float = None):
+        """Registrar una llamada exitosa (y, si fue una transferencia, su velocidad)"""
+        with self._lock:
+            stats = self._get(peer)
+            stats["calls"] += 1
+            stats["last_seen"] = time.time()
+            stats["error_rate"] = self._ewma(stats["error_rate"], 0.0)
+            if rtt is not None:
+                stats["rtt"] = self._ewma(stats["rtt"], rtt)
+            if nbytes and nbytes >= self.min_transfer_bytes and seconds and seconds > 0:
+                stats["throughput"] = self._ewma(stats["throughput"], nbytes / seconds)
+
+    def record_failure(self, peer: str):
+        """Registrar un error o timeout"""
+        with self._lock:
+            stats = self._get(peer)
+            stats["calls"] += 1
+            stats["errors"] += 1
+            stats["error_rate"] = self._ewma(stats["error_rate"], 1.0)
+
+    def score(self, peer: str, default_throughput: float = None):
+        """
+        Costo estimado en segundos de bajar reference_bytes desde el peer,
+        inflado por su tasa de error. None si aún no respondió nunca.
+        """
+        stats = self._stats.get(peer)
+        if stats is None or stats["rtt"] is None:
+            return None
+        cost = stats["rtt"]
+        throughput = stats["throughput"] or default_throughput
+        if throughput:
+            cost += self.reference_bytes / throughput
+        return cost / max(1.0 - stats["error_rate"], 0.05)
+
+    def rank(self, items, key=lambda item: item["peer"]):
+        """
+        Ordenar items (p. ej. fuentes) del peer más barato al más caro.
+        Los peers sin datos se ubican en el promedio para darles oportunidad;
+        los que solo han fallado van al final.
+        """
+        items = list(items)
+        with self._lock:
+            known = [s["throughput"] for s in self._stats.values() if s["throughput"]]
+            default_throughput = sum(known) / len(known) if known else None
+            scores = {key(item): self.score(key(item), default_throughput) for item in items}
+
+        known = [s for s in scores.values() if s is not None]
+        default = sum(known) / len(known) if known else 0.0
+
+        def cost(item):
+            name = key(item)
+            if scores[name] is not None:
+                return scores[name]
+            stats = self._stats.get(name)
+            return float("inf") if stats and stats["errors"] else default
+
+        return sorted(items, key=cost)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                peer: dict(stats, score=self.score(peer))
+                for peer, stats in self._stats.items()
+            }
+
+    def _get(self, peer: str):
+        if peer not in self._stats:
+            self._stats[peer] = {
+                "rtt": None, "throughput": None, "error_rate": 0.0,
+                "calls": 0, "errors": 0, "last_seen": None,
+            }
+        return self._stats[peer]
+
+    def _ewma(self, current, sample: float):
+        return sample if current is None else self.alpha * sample + (1 - self.alpha) * current
@@ -0,0 +1,106 @@
+import asyncio
+
+# --------- Coalescencia de descargas (single-flight) ----------
+class FlightError(Exception):
+    """La transferencia compartida falló antes de terminar"""
+
+
+class Flight:
+    """
+    Una transferencia desde otro peer que varios pedidos siguen a la vez.
+    Un solo bombeo escribe los bytes en un archivo de spool; cada lector tiene
+    el spool abierto y avanza a su propio ritmo, esperando en el event loop
+    cuando alcanza al escritor. write() y read() leen y escriben el spool
+    desde un hilo para no trabar el loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self.meta = None    # status/headers o versión del archivo, cuando se conocen
+        self.error = None   # motivo si la transferencia falló
+        self.done = False
+        self._file = open(path, "wb")
+        self._changed = asyncio.Event()
+
+    def start(self, **meta):
+        """Publicar los metadatos de la respuesta: los lectores ya pueden responder"""
+        self.meta = meta
+        self._notify()
+
+    async def write(self, data: bytes):
+        await asyncio.to_thread(self._append, data)
+        self.size += len(data)
+        self._notify()
+
+    def finish(self, error: str = None):
+        self._file.close()
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def wait_ready(self):
+        """Esperar a que haya metadatos (o a que la transferencia termine)"""
+        while self.meta is None and not self.done:
+            await self._changed.wait()
+        return self.meta
+
+    async def read(self, reader, chunk_size: int = 64 * 1024):
+        """Bloques del spool, desde el principio, a medida que se van escribiendo"""
+        position = 0
+        try:
+            while True:
+                if position < self.size:
+                    data = await asyncio.to_thread(reader.read, min(chunk_size, self.size - position))
+                    position += len(data)
+                    yield data
+                elif not self.done:
+                    await self._changed.wait()
+                elif self.error:
+                    raise FlightError(self.error)
+                else:
+                    return
+        finally:
+            reader.close()
+
+    def _append(self, data: bytes):
+        self._file.write(data)
+        self._file.flush()
+
+    def _notify(self):
+        # Despertar a todos los que esperan y preparar el evento siguiente
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class FlightGroup:
+    """
+    Transferencias en curso, una por archivo. Se usa desde un solo event loop:
+    join y leave no esperan nada, así que no hace falta un lock.
+    """
+
+    def __init__(self, spool_path, flight_class=Flight):
+        # spool_path(nombre) da la ruta del archivo de spool de una transferencia nueva
+        self.spool_path = spool_path
+        self.flight_class = flight_class
+        self._flights = {}
+
+    def join(self, filename: str):
+        """
+        Sumarse a la transferencia de filename, o iniciarla si no hay ninguna.
+        Devuelve (flight, lector, es_lider); el lector ya tiene el spool abierto,
+        así que sigue siendo válido aunque el spool se mueva o se borre después.
+        """
+        flight = self._flights.get(filename)
+        leader = flight is None
+        if leader:
+            flight = self._flights[filename] = self.flight_class(self.spool_path(filename))
+        return flight, open(flight.path, "rb"), leader
+
+    def leave(self, filename: str, flight: Flight):
+        """Dejar de ofrecer la transferencia a pedidos nuevos"""
+        if self._flights.get(filename) is flight:
+            del self._flights[filename]
+
+    def __len__(self):
+        return len(self._flights)
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+
+# --------- Descarga multi-fuente (swarm) ----------
+class SwarmError(Exception):
+    """No se pudo completar la descarga con las fuentes disponibles"""
+
+
+async def probe_size(client, url: str):
+    """
+    Tamaño del archivo en la fuente, pidiendo solo el primer byte.
+    None si la fuente no acepta peticiones por rango.
+    """
+    # Alcanza con los headers: la respuesta se cierra sin leer el cuerpo, que
+    # puede ser el archivo entero si la fuente ignora el Range
+    async with client.stream("GET", url, headers={"Range": "bytes=0-0"}) as resp:
+        # 416 es lo que responde un archivo vacío: "bytes */0"
+        if resp.status_code not in (206, 416):
+            return None
+        total = resp.headers.get("content-range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+
+
+async def fetch_range(client, url: str, offset: int, length: int):
+    """Traer los bytes [offset, offset + length) de una fuente"""
+    resp = await client.get(url, headers={"Range": f"bytes={offset}-{offset + length - 1}"})
+    if resp.status_code != 206:
+        raise SwarmError(f"{url} respondió {resp.status_code} a un pedido por rango")
+    if len(resp.content) != length:
+        raise SwarmError(f"{url} devolvió {len(resp.content)} de {length} bytes")
+    return resp.content
+
+
+async def swarm_download(client, sources, path: str, size: int, piece_size: int = 4 * 1024 * 1024,
+                         per_source: int = 2, max_failures: int = 3, on_success=None, on_failure=None):
+    """
+    Descargar un archivo de size bytes desde varias fuentes a la vez.
+
+    sources es una lista de {"peer", "download_url"}. El archivo se parte en
+    piezas de piece_size que van a una cola común; cada fuente tiene per_source
+    trabajadores que toman la siguiente pieza libre, así que los peers lentos
+    terminan pidiendo menos piezas. Una pieza que falla vuelve a la cola para
+    otra fuente y una fuente con max_failures fallos deja de usarse.
+    Cada pieza se escribe en su offset de path, preasignado a size bytes.
+
+    on_success(peer, nbytes, seconds) y on_failure(peer, error) permiten
+    llevar estadísticas por peer. Devuelve {peer: bytes descargados}.
+    """
+    pieces = asyncio.Queue()
+    for offset in range(0, size, piece_size):
+        pieces.put_nowait((offset, min(piece_size, size - offset)))
+
+    fetched = {s["peer"]: 0 for s in sources}
+    failures = dict.fromkeys(fetched, 0)
+
+    with open(path, "wb") as f:
+        f.truncate(size)
+    fd = os.open(path, os.O_WRONLY)
+
+    async def worker(source: dict):
+        peer = source["peer"]
+        while failures[peer] < max_failures:
+            try:
+                offset, length = pieces.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.monotonic()
+            try:
+                data = await fetch_range(client, source["download_url"], offset, length)
+            except Exception as e:
+                failures[peer] += 1
+                pieces.put_nowait((offset, length))  # otra fuente la tomará
+                if on_failure:
+                    on_failure(peer, e)
+                continue
+            await asyncio.to_thread(os.pwrite, fd, data, offset)
+            fetched[peer] += length
+            if on_success:
+                on_success(peer, length, time.monotonic() - start)
+
+    try:
+        # Si una pieza vuelve a la cola cuando los demás trabajadores ya
+        # terminaron, se relanzan con las fuentes que siguen sanas
+        while not pieces.empty():
+            alive = [s for s in sources if failures[s["peer"]] < max_failures]
+            if not alive:
+                raise SwarmError("Todas las fuentes fallaron")
+            await asyncio.gather(*(worker(s) for s in alive for _ in range(per_source)))
+    finally:
+        os.close(fd)
+    return fetched
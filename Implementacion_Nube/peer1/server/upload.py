@@ -0,0 +1,163 @@
+import os
+import uuid
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# --------- Subida de archivos en streaming ----------
+class UploadError(Exception):
+    """El cuerpo de la subida no es un multipart/form-data con un archivo"""
+
+
+class UploadTooLarge(UploadError):
+    """El archivo supera el tamaño máximo permitido"""
+
+
+class StagedFile:
+    """
+    Archivo que se escribe aparte, en directory/.partial, y se publica de una
+    vez: commit() lo pasa a disco (fsync) y lo renombra sobre el destino con
+    os.replace, así quien lo lea ve la versión anterior completa o la nueva
+    completa, nunca una a medias. Si se sube el mismo nombre varias veces a la
+    vez (también desde el otro servidor) gana la última subida en terminar.
+    Los métodos bloquean: en código async se llaman desde un hilo.
+    """
+
+    def __init__(self, directory: str, filename: str):
+        self.directory = directory
+        self.filename = filename
+        self.path = os.path.join(directory, filename)
+        partial_dir = os.path.join(directory, ".partial")
+        os.makedirs(partial_dir, exist_ok=True)
+        # Un temporal por subida: las simultáneas no se pisan
+        self.temp_path = os.path.join(partial_dir, f"{uuid.uuid4().hex}.part")
+        self._file = open(self.temp_path, "wb")
+
+    def write(self, data: bytes):
+        self._file.write(data)
+
+    def commit(self, store=None):
+        """
+        Publicar el archivo en su ruta definitiva, o en el almacén de chunks
+        store (ChunkStore) si se indica
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        if store is not None:
+            store.put_file(self.filename, self.temp_path)
+            os.remove(self.temp_path)
+            # Una copia vieja fuera del almacén taparía a la nueva
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        os.replace(self.temp_path, self.path)
+        # Que el renombre también sobreviva a un corte de luz
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def abort(self):
+        """Descartar lo escrito; el destino queda como estaba"""
+        self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class MultipartFileWriter:
+    """
+    Parser incremental de un cuerpo multipart/form-data que escribe el campo
+    de archivo field_name en directory a medida que llegan los bytes, sin
+    juntar el archivo en memoria. Los demás campos se descartan.
+
+    El archivo se arma en un StagedFile y finish() lo publica (en el almacén
+    de chunks store si se indica). feed() y finish() escriben en disco
+    (bloquean): se llaman desde un hilo.
+    Si algo falla hay que llamar a abort() para descartar lo escrito.
+    """
+
+    def __init__(self, content_type: str, directory: str, field_name: str = "file", max_bytes: int = None,
+                 store=None):
+        kind, params = parse_options_header(content_type)
+        if kind != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadError("Se esperaba un cuerpo multipart/form-data")
+        self.directory = directory
+        self.field_name = field_name
+        self.max_bytes = max_bytes
+        self.store = store
+        self.filename = None
+        self.size = 0
+        self._file = None
+        self._done = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers = {}
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, data: bytes):
+        self._parser.write(data)
+
+    def finish(self):
+        """Terminar de procesar el cuerpo; devuelve (nombre del archivo, tamaño)"""
+        self._parser.finalize()
+        if not self._done:
+            raise UploadError(f"Falta el campo de archivo '{self.field_name}'")
+        self._file.commit(self.store)
+        self._file = None
+        return self.filename, self.size
+
+    def abort(self):
+        """Descartar el archivo a medias (el que ya estaba publicado no se toca)"""
+        if self._file is not None:
+            self._file.abort()
+            self._file = None
+
+    # ---- Callbacks del parser ----
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8")
+        if name != self.field_name or b"filename" not in options or self.filename is not None:
+            return  # campo que no es el archivo: se descarta
+        self.filename = options[b"filename"].decode("utf-8")
+        if not self.filename:
+            raise UploadError("El archivo no tiene nombre")
+        self._file = StagedFile(self.directory, self.filename)
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._file is None or self._done:
+            return
+        self.size += end - start
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadTooLarge(f"El archivo supera el máximo de {self.max_bytes} bytes")
+        self._file.write(data[start:end])
+
+    def _on_part_end(self):
+        if self._file is not None:
+            self._done = True
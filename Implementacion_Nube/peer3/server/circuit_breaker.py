@@ -0,0 +1,91 @@
+import threading
+import time
+
+# --------- Circuit breaker por peer ----------
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Se intentó llamar a un peer cuyo circuito está abierto"""
+
+
+class CircuitBreaker:
+    """
+    Un circuito por peer remoto:
+    - closed: el peer se usa normalmente; failure_threshold fallos seguidos lo abren.
+    - open: el peer se salta sin esperar ningún timeout.
+    - half_open: pasado reset_timeout se deja pasar una sola sonda; si responde
+      el circuito se cierra y si no se vuelve a abrir por el doble de tiempo
+      (hasta max_reset_timeout).
+    Las sondas las lanza un proceso en segundo plano (ver due_for_probe).
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10, max_reset_timeout: float = 120):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def allow(self, peer: str):
+        """True si se puede llamar al peer ahora (circuito cerrado)"""
+        circuit = self._circuits.get(peer)
+        return circuit is None or circuit["state"] == CLOSED
+
+    def record_success(self, peer: str):
+        """El peer respondió: cerrar su circuito"""
+        with self._lock:
+            circuit = self._get(peer)
+            circuit.update(state=CLOSED, failures=0, timeout=self.reset_timeout, opened_at=None)
+
+    def record_failure(self, peer: str):
+        """Error o timeout del peer: abrir el circuito si se pasó el umbral"""
+        with self._lock:
+            circuit = self._get(peer)
+            circuit["failures"] += 1
+            if circuit["state"] == HALF_OPEN:
+                # La sonda falló: esperar más antes de volver a probar
+                circuit["timeout"] = min(circuit["timeout"] * 2, self.max_reset_timeout)
+                circuit.update(state=OPEN, opened_at=time.monotonic())
+            elif circuit["state"] == CLOSED and circuit["failures"] >= self.failure_threshold:
+                circuit.update(state=OPEN, opened_at=time.monotonic())
+
+    def due_for_probe(self):
+        """
+        Peers con el circuito abierto cuyo reset_timeout ya venció.
+        Pasan a half_open: quien los reciba debe sondearlos y registrar el resultado.
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for peer, circuit in self._circuits.items():
+                if circuit["state"] == OPEN and now - circuit["opened_at"] >= circuit["timeout"]:
+                    circuit["state"] = HALF_OPEN
+                    due.append(peer)
+        return due
+
+    def state(self, peer: str):
+        circuit = self._circuits.get(peer)
+        return circuit["state"] if circuit else CLOSED
+
+    def to_dict(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                peer: {
+                    "state": circuit["state"],
+                    "failures": circuit["failures"],
+                    "open_for": round(now - circuit["opened_at"], 3) if circuit["opened_at"] else None,
+                    "retry_after": circuit["timeout"],
+                }
+                for peer, circuit in self._circuits.items()
+            }
+
+    def _get(self, peer: str):
+        if peer not in self._circuits:
+            self._circuits[peer] = {
+                "state": CLOSED, "failures": 0, "timeout": self.reset_timeout, "opened_at": None,
+            }
+        return self._circuits[peer]
@@ -24,19 +24,39 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\ngrpc.proto\x12\x0c\x66ile_service\"\x1f\n\x0b\x46ileRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\"D\n\tFileChunk\x12\x0f\n\x07\x63ontent\x18\x01 \x01(\x0c\x12\x10\n\x08\x66ilename\x18\x02 \x01(\t\x12\x14\n\x0c\x63hunk_number\x18\x03 \x01(\x03\"0\n\x0cUploadStatus\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t2\x98\x01\n\x0b\x46ileService\x12\x44\n\x0c\x44ownloadFile\x12\x19.file_service.FileRequest\x1a\x17.file_service.FileChunk0\x01\x12\x43\n\nUploadFile\x12\x17.file_service.FileChunk\x1a\x1a.file_service.UploadStatus(\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\ngrpc.proto\x12\x0c\x66ile_service\"\x89\x01\n\x0b\x46ileRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x10\n\x08query_id\x18\x02 \x01(\t\x12\x0b\n\x03ttl\x18\x03 \x01(\x05\x12\x0f\n\x07visited\x18\x04 \x03(\t\x12\x0e\n\x06offset\x18\x05 \x01(\x03\x12\x0e\n\x06length\x18\x06 \x01(\x03\x12\x18\n\x10\x65xpected_version\x18\x07 \x01(\t\"\x9f\x01\n\tFileChunk\x12\x0f\n\x07\x63ontent\x18\x01 \x01(\x0c\x12\x10\n\x08\x66ilename\x18\x02 \x01(\t\x12\x14\n\x0c\x63hunk_number\x18\x03 \x01(\x03\x12\x0e\n\x06offset\x18\x04 \x01(\x03\x12\x11\n\tfile_size\x18\x05 \x01(\x03\x12\x0f\n\x07version\x18\x06 \x01(\t\x12\x14\n\x0creplicate_to\x18\x07 \x03(\t\x12\x0f\n\x07replica\x18\x08 \x01(\x08\"B\n\x0cUploadStatus\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x10\n\x08replicas\x18\x03 \x03(\t\"\x10\n\x0eSummaryRequest\"c\n\x0e\x43\x61talogSummary\x12\x0c\n\x04peer\x18\x01 \x01(\t\x12\x0f\n\x07version\x18\x02 \x01(\x03\x12\x10\n\x08num_bits\x18\x03 \x01(\x05\x12\x12\n\nnum_hashes\x18\x04 \x01(\x05\x12\x0c\n\x04\x62its\x18\x05 \x01(\x0c\"!\n\rLocateRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\"B\n\nFileSource\x12\x0c\n\x04peer\x18\x01 \x01(\t\x12\x14\n\x0c\x64ownload_url\x18\x02 \x01(\t\x12\x10\n\x08url_grpc\x18\x03 \x01(\t\"Z\n\x0cLocateResult\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\r\n\x05\x66ound\x18\x02 \x01(\x08\x12)\n\x07sources\x18\x03 \x03(\x0b\x32\x18.file_service.FileSource\"<\n\x13LocateStreamRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x13\n\x0bmax_sources\x18\x02 \x01(\x05\"8\n\x10SignatureRequest\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x12\n\nblock_size\x18\x02 \x01(\x05\"g\n\x0f\x42lockSignatures\x12\x0f\n\x07version\x18\x01 \x01(\t\x12\x11\n\tfile_size\x18\x02 \x01(\x03\x12\x12\n\nblock_size\x18\x03 \x01(\x05\x12\x0c\n\x04weak\x18\x04 \x03(\r\x12\x0e\n\x06strong\x18\x05 \x03(\x0c\"*\n\nBlockRange\x12\r\n\x05start\x18\x01 \x01(\x03\x12\r\n\x05\x63ount\x18\x02 \x01(\x03\"\xae\x01\n\nDeltaChunk\x12\x10\n\x08\x66ilename\x18\x01 \x01(\t\x12\x14\n\x0c\x62\x61se_version\x18\x02 \x01(\t\x12\x12\n\nblock_size\x18\x03 \x01(\x05\x12\x11\n\x07literal\x18\x04 \x01(\x0cH\x00\x12(\n\x04\x63opy\x18\x05 \x01(\x0b\x32\x18.file_service.BlockRangeH\x00\x12\x11\n\tfile_size\x18\x06 \x01(\x03\x12\x0e\n\x06sha256\x18\x07 \x01(\tB\x04\n\x02op2\x98\x04\n\x0b\x46ileService\x12\x44\n\x0c\x44ownloadFile\x12\x19.file_service.FileRequest\x1a\x17.file_service.FileChunk0\x01\x12\x43\n\nUploadFile\x12\x17.file_service.FileChunk\x1a\x1a.file_service.UploadStatus(\x01\x12O\n\x11GetCatalogSummary\x12\x1c.file_service.SummaryRequest\x1a\x1c.file_service.CatalogSummary\x12\x45\n\x06Locate\x12\x1b.file_service.LocateRequest\x1a\x1a.file_service.LocateResult(\x01\x30\x01\x12M\n\x0cLocateStream\x12!.file_service.LocateStreamRequest\x1a\x18.file_service.FileSource0\x01\x12P\n\rGetSignatures\x12\x1e.file_service.SignatureRequest\x1a\x1d.file_service.BlockSignatures0\x01\x12\x45\n\x0bUploadDelta\x12\x18.file_service.DeltaChunk\x1a\x1a.file_service.UploadStatus(\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'grpc_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_FILEREQUEST']._serialized_start=28
-  _globals['_FILEREQUEST']._serialized_end=59
-  _globals['_FILECHUNK']._serialized_start=61
-  _globals['_FILECHUNK']._serialized_end=129
-  _globals['_UPLOADSTATUS']._serialized_start=131
-  _globals['_UPLOADSTATUS']._serialized_end=179
-  _globals['_FILESERVICE']._serialized_start=182
-  _globals['_FILESERVICE']._serialized_end=334
-# @@protoc_insertion_point(module_scope)
\ No newline at end of file
+  _globals['_FILEREQUEST']._serialized_start=29
+  _globals['_FILEREQUEST']._serialized_end=166
+  _globals['_FILECHUNK']._serialized_start=169
+  _globals['_FILECHUNK']._serialized_end=328
+  _globals['_UPLOADSTATUS']._serialized_start=330
+  _globals['_UPLOADSTATUS']._serialized_end=396
+  _globals['_SUMMARYREQUEST']._serialized_start=398
+  _globals['_SUMMARYREQUEST']._serialized_end=414
+  _globals['_CATALOGSUMMARY']._serialized_start=416
+  _globals['_CATALOGSUMMARY']._serialized_end=515
+  _globals['_LOCATEREQUEST']._serialized_start=517
+  _globals['_LOCATEREQUEST']._serialized_end=550
+  _globals['_FILESOURCE']._serialized_start=552
+  _globals['_FILESOURCE']._serialized_end=618
+  _globals['_LOCATERESULT']._serialized_start=620
+  _globals['_LOCATERESULT']._serialized_end=710
+  _globals['_LOCATESTREAMREQUEST']._serialized_start=712
+  _globals['_LOCATESTREAMREQUEST']._serialized_end=772
+  _globals['_SIGNATUREREQUEST']._serialized_start=774
+  _globals['_SIGNATUREREQUEST']._serialized_end=830
+  _globals['_BLOCKSIGNATURES']._serialized_start=832
+  _globals['_BLOCKSIGNATURES']._serialized_end=935
+  _globals['_BLOCKRANGE']._serialized_start=937
+  _globals['_BLOCKRANGE']._serialized_end=979
+  _globals['_DELTACHUNK']._serialized_start=982
+  _globals['_DELTACHUNK']._serialized_end=1156
+  _globals['_FILESERVICE']._serialized_start=1159
+  _globals['_FILESERVICE']._serialized_end=1695
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,51 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+# --------- Caché de resultados de /locate ----------
+class LocateCache:
+    """
+    Caché LRU acotada de resultados de locate con expiración.
+    Los "no encontrado" también se guardan, pero por menos tiempo,
+    para que un archivo recién publicado aparezca pronto.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 30, negative_ttl: float = 5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, filename: str):
+        """Resultado cacheado para filename, o None si no hay o ya venció"""
+        with self._lock:
+            entry = self._entries.get(filename)
+            if entry is None:
+                return None
+            expires, result = entry
+            if expires < time.monotonic():
+                del self._entries[filename]
+                return None
+            self._entries.move_to_end(filename)
+            return copy.deepcopy(result)
+
+    def put(self, filename: str, result: dict):
+        ttl = self.ttl if result.get("found") else self.negative_ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[filename] = (time.monotonic() + ttl, copy.deepcopy(result))
+            self._entries.move_to_end(filename)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, filenames=None):
+        """Olvidar los resultados de esos archivos (o todos si no se indica ninguno)"""
+        with self._lock:
+            if filenames is None:
+                self._entries.clear()
+                return
+            for filename in filenames:
+                self._entries.pop(filename, None)
@@ -0,0 +1,50 @@
+import asyncio
+import hashlib
+
+# --------- Réplicas de los archivos subidos ----------
+# Bloques en vuelo por salto de la cadena de réplicas: si el siguiente peer es
+# más lento, quien recibe espera en vez de juntar el archivo en memoria
+CHAIN_QUEUE_SIZE = 8
+
+
+def pick_replicas(filename: str, peers, n: int, strategy: str = "hash", rank=None):
+    """
+    Elegir hasta n de peers (dicts con "name") para guardar réplicas de filename.
+
+    "hash": hashing consistente (rendezvous): cada peer tiene un peso
+    hash(peer, archivo) y se eligen los más altos. Todos los peers eligen los
+    mismos para un archivo, y al sumar o quitar un peer solo cambian las
+    réplicas que le tocaban a ese peer.
+    "load": los primeros según rank (p. ej. PeerStats.rank): los que vienen
+    respondiendo más rápido, es decir los menos cargados.
+    """
+    if n <= 0:
+        return []
+    if strategy == "load" and rank is not None:
+        ordered = rank(list(peers))
+    else:
+        ordered = sorted(peers, key=lambda p: _weight(p["name"], filename), reverse=True)
+    return ordered[:n]
+
+
+def _weight(peer: str, filename: str):
+    return hashlib.sha1(f"{peer}\0{filename}".encode("utf-8")).digest()
+
+
+async def offer(queue: asyncio.Queue, task: asyncio.Task, item):
+    """
+    Pasar item a la tarea que reenvía al siguiente peer de la cadena, sin
+    trabarse si esa tarea ya terminó (p. ej. porque ese peer falló)
+    """
+    if task.done():
+        return
+    put = asyncio.ensure_future(queue.put(item))
+    await asyncio.wait({put, task}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+
+
+async def queue_items(queue: asyncio.Queue):
+    """Los bloques que llegan por queue hasta None (fin del archivo)"""
+    while (item := await queue.get()) is not None:
+        yield item
@@ -0,0 +1,227 @@
+import base64
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+
+# --------- Índice de archivos por peer ----------
+class FileIndex:
+    """
+    Índice invertido del catálogo de la red.
+    Mantiene filename -> peers y peer -> filenames con sets,
+    así que consultar quién tiene un archivo es O(1) sin importar
+    cuántos archivos tenga cada peer.
+
+    Cada peer tiene además una versión monótona y un changelog acotado,
+    para poder responder "qué cambió desde la versión X".
+    """
+
+    def __init__(self, changelog_size: int = 10000):
+        self._by_file = {}
+        self._by_peer = {}
+        self._versions = {}
+        self._changelogs = {}
+        self._changelog_size = changelog_size
+        # Las versiones arrancan en el reloj (ms) para que sigan creciendo tras un reinicio
+        self._base_version = int(time.time() * 1000)
+        self._generation = self._base_version
+        self._lock = threading.Lock()
+
+    def add(self, peer: str, filename: str):
+        """Registrar un archivo en un peer. Devuelve False si ya estaba."""
+        with self._lock:
+            if filename in self._by_peer.get(peer, ()):
+                return False
+            version = self._bump(peer)
+            self._add(peer, filename, version)
+            return True
+
+    def touch(self, peer: str, filename: str):
+        """
+        Registrar un archivo del peer que es nuevo o cambió de contenido.
+        A diferencia de add, sube la versión aunque ya estuviera: el cambio
+        viaja en el delta como agregado y los demás peers descartan lo que
+        tengan cacheado. Devuelve True si el archivo no estaba.
+        """
+        with self._lock:
+            new = filename not in self._by_peer.get(peer, ())
+            version = self._bump(peer)
+            self._add(peer, filename, version)
+            return new
+
+    def remove(self, peer: str, filename: str):
+        """Quitar un archivo de un peer. Devuelve False si no estaba."""
+        with self._lock:
+            if filename not in self._by_peer.get(peer, ()):
+                return False
+            version = self._bump(peer)
+            self._remove(peer, filename, version)
+            return True
+
+    def replace_peer(self, peer: str, filenames, version: int = None):
+        """
+        Reemplazar por completo la lista de archivos conocida de un peer.
+        Si se da version (la que reporta el peer remoto) se guarda tal cual.
+        """
+        new_files = set(filenames)
+        with self._lock:
+            if self._is_stale(peer, version):
+                return
+            old_files = self._by_peer.get(peer, set())
+            if new_files != old_files or peer not in self._by_peer:
+                current = self._bump(peer, version)
+                for filename in old_files - new_files:
+                    self._remove(peer, filename, current)
+                for filename in new_files - old_files:
+                    self._add(peer, filename, current)
+            elif version is not None:
+                self._versions[peer] = version
+
+    def apply_changes(self, peer: str, added, removed, version: int):
+        """Aplicar un delta (archivos agregados y quitados) recibido de un peer remoto"""
+        with self._lock:
+            if self._is_stale(peer, version):
+                return
+            current = self._bump(peer, version)
+            self._by_peer.setdefault(peer, set())
+            for filename in removed:
+                if filename in self._by_peer[peer]:
+                    self._remove(peer, filename, current)
+            for filename in added:
+                if filename not in self._by_peer[peer]:
+                    self._add(peer, filename, current)
+
+    def changes_since(self, peer: str, since: int):
+        """
+        Devuelve (agregados, quitados) del peer desde la versión since,
+        o None si el changelog ya no alcanza y hay que mandar la lista completa.
+        """
+        with self._lock:
+            log = self._changelogs.get(peer, ())
+            # Si el changelog se llenó, las entradas más viejas pudieron perderse
+            floor = log[0][0] if len(log) == self._changelog_size else self._base_version
+            if since < floor or since > self._versions.get(peer, self._base_version):
+                return None
+
+            initially_present = {}
+            for version, op, filename in log:
+                if version > since and filename not in initially_present:
+                    initially_present[filename] = (op == "remove")
+
+            files = self._by_peer.get(peer, ())
+            added = [f for f, present in initially_present.items() if not present and f in files]
+            removed = [f for f, present in initially_present.items() if present and f not in files]
+            return added, removed
+
+    def has(self, peer: str, filename: str):
+        """¿El peer tiene el archivo?"""
+        return filename in self._by_peer.get(peer, ())
+
+    def peers_with(self, filename: str):
+        """Conjunto de peers que tienen el archivo"""
+        with self._lock:
+            return set(self._by_file.get(filename, ()))
+
+    def files_of(self, peer: str):
+        """Lista de archivos de un peer"""
+        with self._lock:
+            return list(self._by_peer.get(peer, ()))
+
+    def version(self, peer: str):
+        """Versión actual de la lista de un peer (None si nunca se registró)"""
+        return self._versions.get(peer)
+
+    def generation(self):
+        """Versión global del índice: cambia cuando cambia la lista de cualquier peer"""
+        return self._generation
+
+    def __contains__(self, peer: str):
+        return peer in self._by_peer
+
+    def to_dict(self):
+        """Representación {peer: [archivos]} usada en las respuestas JSON"""
+        with self._lock:
+            return {peer: list(files) for peer, files in self._by_peer.items()}
+
+    def _is_stale(self, peer: str, version: int):
+        # Una respuesta vieja que llega tarde no debe pisar una más nueva
+        return version is not None and version < self._versions.get(peer, version)
+
+    def _bump(self, peer: str, version: int = None):
+        if version is None:
+            version = max(self._versions.get(peer, self._base_version) + 1, int(time.time() * 1000))
+        self._versions[peer] = version
+        self._generation += 1
+        return version
+
+    def _add(self, peer: str, filename: str, version: int):
+        self._by_peer.setdefault(peer, set()).add(filename)
+        self._by_file.setdefault(filename, set()).add(peer)
+        self._log(peer, version, "add", filename)
+
+    def _remove(self, peer: str, filename: str, version: int):
+        self._by_peer[peer].discard(filename)
+        holders = self._by_file.get(filename)
+        if holders is not None:
+            holders.discard(peer)
+            if not holders:
+                del self._by_file[filename]
+        self._log(peer, version, "remove", filename)
+
+    def _log(self, peer: str, version: int, op: str, filename: str):
+        log = self._changelogs.get(peer)
+        if log is None:
+            log = self._changelogs[peer] = deque(maxlen=self._changelog_size)
+        log.append((version, op, filename))
+
+
+# --------- Resumen compacto del catálogo ----------
+class BloomFilter:
+    """
+    Filtro de Bloom sobre nombres de archivo.
+    Sirve para publicar un resumen del catálogo de un peer: si dice que no,
+    el archivo seguro no está; si dice que sí, hay que confirmarlo.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytes = None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(bits) if bits is not None else bytearray((num_bits + 7) // 8)
+
+    @classmethod
+    def from_items(cls, items, fp_rate: float = 0.01):
+        """Crear un filtro dimensionado para los items y la tasa de falsos positivos dada"""
+        items = list(items)
+        n = max(len(items), 1)
+        num_bits = max(8, math.ceil(-n * math.log(fp_rate) / (math.log(2) ** 2)))
+        num_hashes = max(1, round(num_bits / n * math.log(2)))
+        bloom = cls(num_bits, num_hashes)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def might_contain(self, item: str):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_dict(self):
+        return {
+            "num_bits": self.num_bits,
+            "num_hashes": self.num_hashes,
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data["num_bits"], data["num_hashes"], base64.b64decode(data["bits"]))
+
+    def _positions(self, item: str):
+        # Doble hashing sobre sha256: estable entre procesos y máquinas
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
@@ -0,0 +1,286 @@
+import asyncio
+import hashlib
+import math
+from itertools import accumulate, islice
+
+import grpc
+import grpc_pb2
+
+# --------- Transferencia por diferencias (estilo rsync) ----------
+# El peer que ya tiene el archivo manda las firmas de cada bloque de su versión
+# (GetSignatures); quien sube la versión nueva la recorre con un checksum
+# rodante buscando esos bloques en cualquier posición y manda solo los datos
+# nuevos y referencias a los bloques que el peer ya tiene (UploadDelta).
+MIN_BLOCK_SIZE = 512
+MAX_BLOCK_SIZE = 1024 * 1024
+# Datos nuevos por mensaje DeltaChunk y firmas por mensaje BlockSignatures
+LITERAL_SIZE = 64 * 1024
+SIGNATURE_BATCH = 1024
+READ_SIZE = 1024 * 1024
+
+
+def pick_block_size(file_size: int, requested: int = 0):
+    """Tamaño de bloque para las firmas: el pedido, o ~sqrt(tamaño) entre 2 KB y 64 KB (como rsync)"""
+    if requested:
+        return min(max(requested, MIN_BLOCK_SIZE), MAX_BLOCK_SIZE)
+    return min(max(math.isqrt(file_size), 2048), 64 * 1024)
+
+
+def weak_checksum(block: bytes):
+    """Checksum rodante de rsync: a = suma de los bytes, b = suma de las sumas parciales (mod 2^16)"""
+    return (sum(block) & 0xFFFF) | ((sum(accumulate(block)) & 0xFFFF) << 16)
+
+
+def strong_checksum(block: bytes):
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def iter_signatures(f, block_size: int):
+    """(weak, strong) de cada bloque de un archivo abierto, en orden"""
+    while block := f.read(block_size):
+        yield weak_checksum(block), strong_checksum(block)
+
+
+class DeltaError(Exception):
+    """Las diferencias no se pueden aplicar sobre la versión local"""
+
+
+class Signatures:
+    """Firmas de la versión base, indexadas por checksum rodante"""
+
+    def __init__(self, batches):
+        """batches: los mensajes BlockSignatures de GetSignatures"""
+        batches = list(batches)
+        first = batches[0]
+        self.version = first.version
+        self.file_size = first.file_size
+        self.block_size = first.block_size
+        self.strong = [s for batch in batches for s in batch.strong]
+        weak = [w for batch in batches for w in batch.weak]
+        # Un último bloque más corto solo puede coincidir con el final del archivo nuevo
+        self.tail_size = self.file_size % self.block_size
+        self.tail = len(weak) - 1 if self.tail_size else None
+        self._by_weak = {}
+        for index, w in enumerate(weak):
+            if index != self.tail:
+                self._by_weak.setdefault(w, []).append(index)
+
+    def match(self, weak: int, data: bytes, start: int, after: int = None):
+        """
+        Índice de un bloque base igual a data[start:start + block_size], o None
+        (prefiere el que sigue a after). Solo se corta el bloque y se calcula el
+        hash fuerte si el checksum rodante coincide con alguno.
+        """
+        candidates = self._by_weak.get(weak)
+        if not candidates:
+            return None
+        strong = strong_checksum(data[start:start + self.block_size])
+        if after is not None and after + 1 in candidates and self.strong[after + 1] == strong:
+            return after + 1
+        for index in candidates:
+            if self.strong[index] == strong:
+                return index
+        return None
+
+    def match_tail(self, block: bytes):
+        if self.tail is not None and len(block) == self.tail_size and self.strong[self.tail] == strong_checksum(block):
+            return self.tail
+        return None
+
+
+def delta_ops(f, signatures: Signatures, hasher=None):
+    """
+    Recorrer un archivo abierto y devolver las operaciones para rearmarlo
+    sobre la versión base: ("literal", datos) o ("copy", bloque).
+    Donde el contenido coincide se avanza de a un bloque; solo en las partes
+    cambiadas se corre la ventana byte a byte, así el costo (y lo que se
+    transmite) crece con el tamaño de la edición, no con el del archivo.
+    Si se da hasher se le pasan todos los bytes leídos.
+    """
+    size = signatures.block_size
+    buffer = b""
+    i = 0        # inicio de la ventana dentro de buffer
+    literal = 0  # inicio de los datos nuevos pendientes de enviar
+    previous = None
+    rolling = False
+    eof = False
+    while True:
+        if not eof and len(buffer) - i <= size:
+            data = f.read(READ_SIZE)
+            eof = not data
+            if hasher is not None:
+                hasher.update(data)
+            buffer = buffer[literal:] + data
+            i -= literal
+            literal = 0
+            continue
+        if len(buffer) - i < size:
+            break
+
+        if not rolling:
+            window = buffer[i:i + size]
+            a = sum(window) & 0xFFFF
+            b = sum(accumulate(window)) & 0xFFFF
+            rolling = True
+        index = signatures.match(a | (b << 16), buffer, i, previous)
+        if index is not None:
+            if literal < i:
+                yield "literal", buffer[literal:i]
+            yield "copy", index
+            previous = index
+            i += size
+            literal = i
+            rolling = False
+            continue
+
+        # Sin coincidencia: correr la ventana un byte
+        if i + size < len(buffer):
+            out = buffer[i]
+            a = (a - out + buffer[i + size]) & 0xFFFF
+            b = (b - size * out + a) & 0xFFFF
+        i += 1
+        if i - literal >= LITERAL_SIZE:
+            yield "literal", buffer[literal:i]
+            literal = i
+
+    tail = signatures.match_tail(buffer[i:])
+    if tail is not None:
+        if literal < i:
+            yield "literal", buffer[literal:i]
+        yield "copy", tail
+    elif literal < len(buffer):
+        yield "literal", buffer[literal:]
+
+
+class DeltaEncoder:
+    """
+    Mensajes DeltaChunk para subir con UploadDelta lo que se lee de f,
+    como diferencias sobre la versión que describen las firmas.
+    Los bloques consecutivos se juntan en un solo BlockRange. Después de
+    recorrerlo, literal_bytes y copied_bytes dicen cuánto se mandó y cuánto
+    se reutilizó. Recorrerlo bloquea (lee y calcula): en código async se
+    recorre desde un hilo.
+    """
+
+    def __init__(self, filename: str, f, signatures: Signatures):
+        self.filename = filename
+        self.f = f
+        self.signatures = signatures
+        self.literal_bytes = 0
+        self.copied_bytes = 0
+
+    def __iter__(self):
+        signatures = self.signatures
+        hasher = hashlib.sha256()
+        yield grpc_pb2.DeltaChunk(
+            filename=self.filename, base_version=signatures.version, block_size=signatures.block_size
+        )
+        start = count = 0
+        for kind, value in delta_ops(self.f, signatures, hasher):
+            if kind == "copy":
+                self.copied_bytes += signatures.tail_size if value == signatures.tail else signatures.block_size
+                if count and value == start + count:
+                    count += 1
+                    continue
+                if count:
+                    yield grpc_pb2.DeltaChunk(copy=grpc_pb2.BlockRange(start=start, count=count))
+                start, count = value, 1
+            else:
+                if count:
+                    yield grpc_pb2.DeltaChunk(copy=grpc_pb2.BlockRange(start=start, count=count))
+                    count = 0
+                self.literal_bytes += len(value)
+                for offset in range(0, len(value), LITERAL_SIZE):
+                    yield grpc_pb2.DeltaChunk(literal=value[offset:offset + LITERAL_SIZE])
+        if count:
+            yield grpc_pb2.DeltaChunk(copy=grpc_pb2.BlockRange(start=start, count=count))
+        yield grpc_pb2.DeltaChunk(file_size=self.literal_bytes + self.copied_bytes, sha256=hasher.hexdigest())
+
+
+class DeltaDecoder:
+    """
+    Aplica los mensajes DeltaChunk sobre la versión base (un archivo abierto
+    con read/seek) y escribe el resultado en out (p. ej. un StagedFile).
+    finish() verifica el tamaño y el sha256 anunciados; si no coinciden o una
+    referencia no existe en la base lanza DeltaError.
+    Los métodos bloquean: en código async se llaman desde un hilo.
+    """
+
+    def __init__(self, base, base_size: int, block_size: int, out):
+        if block_size <= 0:
+            raise DeltaError("Invalid block size")
+        self.base = base
+        self.base_size = base_size
+        self.block_size = block_size
+        self.out = out
+        self.size = 0
+        self.literal_bytes = 0
+        self.copied_bytes = 0
+        self._hasher = hashlib.sha256()
+        self._expected_size = None
+        self._expected_sha256 = None
+
+    def apply(self, chunk):
+        op = chunk.WhichOneof("op")
+        if op == "literal":
+            self._write(chunk.literal)
+            self.literal_bytes += len(chunk.literal)
+        elif op == "copy":
+            offset = chunk.copy.start * self.block_size
+            end = min((chunk.copy.start + chunk.copy.count) * self.block_size, self.base_size)
+            if chunk.copy.start < 0 or chunk.copy.count <= 0 or offset >= end:
+                raise DeltaError(f"Block range out of base file ({chunk.copy.start}+{chunk.copy.count})")
+            self.base.seek(offset)
+            while offset < end:
+                data = self.base.read(min(READ_SIZE, end - offset))
+                if not data:
+                    raise DeltaError("Base file ended early")
+                self._write(data)
+                self.copied_bytes += len(data)
+                offset += len(data)
+        if chunk.sha256:
+            self._expected_size = chunk.file_size
+            self._expected_sha256 = chunk.sha256
+
+    def finish(self):
+        if self._expected_sha256 is None:
+            raise DeltaError(f"Upload incomplete ({self.size} bytes, no checksum)")
+        if self.size != self._expected_size or self._hasher.hexdigest() != self._expected_sha256:
+            raise DeltaError(f"Rebuilt file does not match ({self.size} of {self._expected_size} bytes)")
+
+    def _write(self, data: bytes):
+        self.out.write(data)
+        self._hasher.update(data)
+        self.size += len(data)
+
+
+def take(iterator, n: int):
+    return list(islice(iterator, n))
+
+
+async def send_delta(stub, filename: str, f, block_size: int = 0, timeout: float = None):
+    """
+    Subir con un stub grpc.aio la versión de filename que se lee de f a un
+    peer que ya tiene una versión anterior, mandando solo las diferencias.
+    Devuelve (UploadStatus, DeltaEncoder), o None si el peer no tiene el
+    archivo: en ese caso hay que subirlo completo con UploadFile.
+    """
+    try:
+        batches = [b async for b in stub.GetSignatures(
+            grpc_pb2.SignatureRequest(filename=filename, block_size=block_size), timeout=timeout
+        )]
+    except grpc.aio.AioRpcError as e:
+        if e.code() == grpc.StatusCode.NOT_FOUND:
+            return None
+        raise
+    signatures = await asyncio.to_thread(Signatures, batches)
+    encoder = DeltaEncoder(filename, f, signatures)
+
+    async def messages():
+        iterator = iter(encoder)
+        while batch := await asyncio.to_thread(take, iterator, 16):
+            for message in batch:
+                yield message
+
+    status = await stub.UploadDelta(messages(), timeout=timeout)
+    return status, encoder
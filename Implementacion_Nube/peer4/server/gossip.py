@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+
+# --------- Tabla de membresía para gossip ----------
+class Membership:
+    """
+    Vista local de los miembros de la red, difundida por gossip push-pull.
+
+    Cada miembro tiene un heartbeat que solo su dueño incrementa y la versión
+    de su catálogo. Al mezclar dos vistas gana el heartbeat más alto, así que
+    la información nueva llega a todos en O(log N) rondas. Un miembro cuyo
+    heartbeat no avanza pasa a "suspect" y luego a "dead".
+    El heartbeat sigue al reloj (ms), así un peer que se reinicia anuncia uno
+    mayor que el de antes y los demás no lo descartan como información vieja.
+    Los seeds caídos se pueden sondear con pick_dead_seed, así una partición
+    se cura desde cualquiera de los dos lados.
+    """
+
+    def __init__(self, local: dict, seeds, suspect_after: float = 5, dead_after: float = 15):
+        self.local_name = local["name"]
+        self.suspect_after = suspect_after
+        self.dead_after = dead_after
+        self._lock = threading.Lock()
+        self._members = {}
+        self._members[self.local_name] = self._entry(local, heartbeat=int(time.time() * 1000), version=None)
+        for peer in seeds:
+            self.add_seed(peer)
+
+    def add_seed(self, peer: dict):
+        """Agregar un peer conocido por configuración (aún sin heartbeat)"""
+        if not peer.get("name") or not peer.get("url") or peer["name"] == self.local_name:
+            return
+        with self._lock:
+            if peer["name"] not in self._members:
+                self._members[peer["name"]] = self._entry(peer, heartbeat=0, version=None)
+            self._members[peer["name"]]["seed"] = True
+
+    def beat(self, version: int):
+        """Incrementar el heartbeat propio y publicar la versión del catálogo local"""
+        with self._lock:
+            me = self._members[self.local_name]
+            me["heartbeat"] = max(me["heartbeat"] + 1, int(time.time() * 1000))
+            me["version"] = version
+            me["last_seen"] = time.monotonic()
+
+    def digest(self):
+        """Entradas que se envían en cada mensaje de gossip"""
+        with self._lock:
+            return [
+                {k: m[k] for k in ("name", "url", "url_grpc", "heartbeat", "version")}
+                for m in self._members.values()
+                if self._status(m) != "dead" or m["name"] == self.local_name
+            ]
+
+    def merge(self, entries):
+        """
+        Mezclar la vista recibida con la local.
+        Devuelve los miembros cuya versión de catálogo avanzó.
+        """
+        changed = []
+        now = time.monotonic()
+        with self._lock:
+            for entry in entries:
+                name = entry.get("name")
+                if not name or not entry.get("url") or name == self.local_name:
+                    continue
+                current = self._members.get(name)
+                if current is None:
+                    current = self._members[name] = self._entry(entry, heartbeat=-1, version=None)
+                if entry.get("heartbeat", 0) > current["heartbeat"]:
+                    if entry.get("version") is not None and entry["version"] != current["version"]:
+                        changed.append(dict(current, version=entry["version"]))
+                    current.update(
+                        url=entry["url"],
+                        url_grpc=entry.get("url_grpc", current["url_grpc"]),
+                        heartbeat=entry["heartbeat"],
+                        version=entry.get("version"),
+                        last_seen=now,
+                    )
+        return changed
+
+    def alive_peers(self):
+        """Peers remotos que no se consideran caídos"""
+        with self._lock:
+            return [
+                self._public(m) for m in self._members.values()
+                if m["name"] != self.local_name and self._status(m) != "dead"
+            ]
+
+    def pick_targets(self, fanout: int):
+        """Elegir hasta fanout peers al azar para la siguiente ronda"""
+        peers = self.alive_peers()
+        if not peers:
+            # Todos parecen caídos: reintentar con cualquiera (p. ej. los seeds)
+            with self._lock:
+                peers = [self._public(m) for m in self._members.values() if m["name"] != self.local_name]
+        return random.sample(peers, min(fanout, len(peers)))
+
+    def pick_dead_seed(self):
+        """Un seed al azar de los que se dan por caídos, o None"""
+        with self._lock:
+            dead = [
+                self._public(m) for m in self._members.values()
+                if m["seed"] and m["name"] != self.local_name and self._status(m) == "dead"
+            ]
+        return random.choice(dead) if dead else None
+
+    def version_of(self, name: str):
+        """Última versión de catálogo anunciada por un miembro"""
+        member = self._members.get(name)
+        return member["version"] if member else None
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                name: dict(self._public(m), heartbeat=m["heartbeat"], version=m["version"], status=self._status(m))
+                for name, m in self._members.items()
+            }
+
+    def _status(self, member: dict):
+        if member["name"] == self.local_name:
+            return "alive"
+        silence = time.monotonic() - member["last_seen"]
+        if silence < self.suspect_after:
+            return "alive"
+        if silence < self.dead_after:
+            return "suspect"
+        return "dead"
+
+    @staticmethod
+    def _entry(peer: dict, heartbeat: int, version):
+        return {
+            "name": peer["name"],
+            "url": peer["url"],
+            "url_grpc": peer.get("url_grpc"),
+            "heartbeat": heartbeat,
+            "version": version,
+            "last_seen": time.monotonic(),
+            "seed": False,
+        }
+
+    @staticmethod
+    def _public(member: dict):
+        return {"name": member["name"], "url": member["url"], "url_grpc": member["url_grpc"]}
@@ -1,8 +1,27 @@
+import asyncio
 import json
+import mimetypes
 import os
+import time
+from contextlib import aclosing, asynccontextmanager
+from urllib.parse import quote
+
 import httpx
-from fastapi import FastAPI, Query, UploadFile, File, Body
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, Query, Body, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+
+from .catalog import FileIndex, BloomFilter
+from .gossip import Membership
+from .dht import RoutingTable, ProviderStore, iterative_lookup, key_for
+from .locate_cache import LocateCache
+from .peer_stats import PeerStats
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .swarm import SwarmError, probe_size, swarm_download
+from .file_cache import FileCache
+from .single_flight import Flight, FlightGroup
+from .upload import MultipartFileWriter, StagedFile, UploadError, UploadTooLarge
+from .chunk_store import ChunkStore, ChunkStoreError, FileChunker, chunk_sizes, is_digest
+from .replication import CHAIN_QUEUE_SIZE, offer, pick_replicas, queue_items
 
 # --------- Función para cargar configuración ----------
 def load_config(path: str):
@@ -17,16 +36,133 @@ DIRECTORY = config["directory"]
 LOCAL_PEER_NAME = config.get("name", "peer4")
 LOCAL_PEER_URL = config.get("url", f"http://{config['ip']}:{config['port_rest']}")
 
-# --------- Tabla de archivos por peer (solo local inicialmente) ---------
-peer_files = {
-    LOCAL_PEER_NAME: [
-        f for f in os.listdir(DIRECTORY)
-        if os.path.isfile(os.path.join(DIRECTORY, f))
-    ]
+# Timeout por petición a un peer y deadline global para cada consulta en paralelo
+PEER_TIMEOUT = config.get("peer_timeout", 5)
+LOCATE_DEADLINE = config.get("locate_deadline", 5)
+# Cada cuánto se vuelve a pedir el filtro de Bloom de un peer remoto
+SUMMARY_TTL = config.get("summary_ttl", 10)
+# Gossip: cada cuánto se hace una ronda y con cuántos peers al azar
+GOSSIP_INTERVAL = config.get("gossip_interval", 1)
+GOSSIP_FANOUT = config.get("gossip_fanout", 3)
+# Cada cuánto se sondea un seed dado por caído (por si era una partición)
+GOSSIP_DEAD_PROBE_INTERVAL = config.get("gossip_dead_probe_interval", 10)
+# Motor de /locate: "query" (preguntar a los peers) o "dht" (Kademlia)
+LOCATE_MODE = config.get("locate_mode", "query")
+DHT_REPUBLISH_INTERVAL = config.get("dht_republish_interval", 3600)
+# Cada cuánto se sondean los peers con el circuito abierto
+BREAKER_PROBE_INTERVAL = config.get("breaker_probe_interval", 1)
+# Descarga swarm: tamaño de cada rango y pedidos simultáneos por fuente
+SWARM_PIECE_SIZE = config.get("swarm_piece_size", 4 * 1024 * 1024)
+SWARM_PER_SOURCE = config.get("swarm_per_source", 2)
+# Subidas: bytes que se juntan antes de escribir a disco y tamaño máximo (sin límite si no se indica)
+UPLOAD_CHUNK_SIZE = config.get("upload_chunk_size", 1024 * 1024)
+UPLOAD_MAX_BYTES = config.get("upload_max_bytes")
+# Almacenamiento local: "files" (un archivo por nombre) o "chunks" (almacén deduplicado, ver chunk_store.py)
+STORAGE_ENGINE = config.get("storage_engine", "files")
+# Content-defined chunking: tamaño mínimo, promedio (potencia de 2) y máximo de cada chunk.
+# Deben ser iguales en todos los peers para que los mismos datos den los mismos chunks
+CHUNK_SIZES = {
+    "min_size": config.get("chunk_min_size", 16 * 1024),
+    "avg_size": config.get("chunk_avg_size", 64 * 1024),
+    "max_size": config.get("chunk_max_size", 256 * 1024),
 }
+# Transferencia por chunks: cuántos chunks se piden a la vez
+CHUNK_FETCH_CONCURRENCY = config.get("chunk_fetch_concurrency", 8)
+# Réplicas: copias de cada archivo subido, contando la local (1 = sin réplicas),
+# y cómo se eligen los peers: "hash" (hashing consistente) o "load" (los menos cargados)
+REPLICATION_FACTOR = config.get("replication_factor", 1)
+REPLICATION_STRATEGY = config.get("replication_strategy", "hash")
+
+# --------- Almacén de chunks (storage_engine = "chunks") ---------
+chunk_store = ChunkStore(
+    config.get("chunk_store_dir", os.path.join(DIRECTORY, ".chunks")), **CHUNK_SIZES
+) if STORAGE_ENGINE == "chunks" else None
+# Manifiestos de los archivos comunes, para poder enviarlos por chunks
+file_chunker = FileChunker(**CHUNK_SIZES)
+
+def _local_files():
+    """Archivos locales: los de la carpeta compartida y los del almacén de chunks"""
+    files = [f for f in os.listdir(DIRECTORY) if os.path.isfile(os.path.join(DIRECTORY, f))]
+    if chunk_store is not None:
+        files += chunk_store.files()
+    return files
+
+# --------- Tabla de archivos por peer (solo local inicialmente) ---------
+peer_files = FileIndex()
+peer_files.replace_peer(LOCAL_PEER_NAME, _local_files())
+
+# Resultados recientes de /locate (positivos y negativos)
+locate_cache = LocateCache(
+    max_entries=config.get("locate_cache_size", 10000),
+    ttl=config.get("locate_cache_ttl", 30),
+    negative_ttl=config.get("locate_cache_negative_ttl", 5),
+)
+
+# RTT, throughput y tasa de error (EWMA) de cada peer remoto
+peer_stats = PeerStats(alpha=config.get("stats_alpha", 0.3))
+
+# Circuit breaker por peer: los que fallan seguido se saltan hasta que se recuperen
+breaker = CircuitBreaker(
+    failure_threshold=config.get("breaker_failures", 3),
+    reset_timeout=config.get("breaker_reset_timeout", 10),
+    max_reset_timeout=config.get("breaker_max_reset_timeout", 120),
+)
+
+# Caché en disco de los archivos retransmitidos desde otros peers
+proxy_cache = FileCache(
+    os.path.join(config.get("proxy_cache_dir", DIRECTORY.rstrip("/") + "_cache"), "rest"),
+    max_bytes=config.get("proxy_cache_max_bytes", 1024 ** 3),
+    ttl=config.get("proxy_cache_ttl", 300),
+    policy=config.get("proxy_cache_policy", "lru"),
+)
+# Descargas remotas en curso: los pedidos simultáneos del mismo archivo comparten una
+flights = FlightGroup(proxy_cache.temp_path)
+
+# Filtros de Bloom de los peers remotos: {nombre: (timestamp, BloomFilter)}
+peer_summaries = {}
+# Último filtro calculado para el catálogo local: (version, BloomFilter)
+_local_summary = (None, None)
+
+# --------- Membresía (gossip) ---------
+# Los peers del JSON son solo semillas: el resto se descubre por gossip
+membership = Membership(
+    {"name": LOCAL_PEER_NAME, "url": LOCAL_PEER_URL, "url_grpc": config.get("url_grpc")},
+    config.get("peers", []),
+    suspect_after=config.get("gossip_suspect_after", 5),
+    dead_after=config.get("gossip_dead_after", 15),
+)
+
+# --------- DHT (modo locate_mode = "dht") ---------
+LOCAL_CONTACT = {"name": LOCAL_PEER_NAME, "url": LOCAL_PEER_URL, "url_grpc": config.get("url_grpc")}
+dht_table = RoutingTable(LOCAL_PEER_NAME, k=config.get("dht_k", 20))
+dht_providers = ProviderStore(ttl=2 * DHT_REPUBLISH_INTERVAL)
+for p in config.get("peers", []):
+    dht_table.update(p)
+
+# --------- Cliente HTTP compartido ---------
+# Un único AsyncClient con pool de conexiones para hablar con los demás peers.
+# Se crea al arrancar la app y se cierra al apagarla.
+http_client: httpx.AsyncClient = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=PEER_TIMEOUT,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    tasks = [asyncio.create_task(_gossip_loop()), asyncio.create_task(_breaker_probe_loop())]
+    if LOCATE_MODE == "dht":
+        tasks.append(asyncio.create_task(_dht_republish_loop()))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await http_client.aclose()
 
 # --------- Servidor FastAPI ---------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 def read_root():
@@ -38,9 +174,48 @@ def read_root():
 # --------- Endpoint /files ----------
 
 @app.get("/files")
-async def list_files():
-    """Listar los archivos conocidos por cada peer"""
-    return {"peer_files": peer_files}
+async def list_files(request: Request, since: int = Query(None)):
+    """
+    Listar los archivos conocidos por cada peer.
+    Con ?since=<version> devuelve solo lo agregado y quitado del catálogo local
+    desde esa versión (o la lista completa si el changelog ya no alcanza).
+    Responde 304 si el ETag de If-None-Match sigue vigente.
+    """
+    version = peer_files.version(LOCAL_PEER_NAME)
+    etag = f'"g{peer_files.generation()}"' if since is None else f'"v{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    if since is None:
+        body = {"version": version, "peer_files": peer_files.to_dict()}
+    else:
+        changes = peer_files.changes_since(LOCAL_PEER_NAME, since)
+        body = {"peer": LOCAL_PEER_NAME, "version": version, "full": changes is None}
+        if changes is None:
+            body["files"] = peer_files.files_of(LOCAL_PEER_NAME)
+        else:
+            body["added"], body["removed"] = changes
+    return JSONResponse(body, headers={"ETag": etag})
+
+@app.get("/files/summary")
+async def files_summary():
+    """Resumen compacto (filtro de Bloom) de los archivos locales"""
+    global _local_summary
+    version = peer_files.version(LOCAL_PEER_NAME)
+    if _local_summary[0] != version:
+        _local_summary = (version, BloomFilter.from_items(peer_files.files_of(LOCAL_PEER_NAME)))
+    return {"peer": LOCAL_PEER_NAME, "version": version, **_local_summary[1].to_dict()}
+
+@app.get("/has")
+async def has_file(filename: str = Query(...)):
+    """Confirmar si este peer tiene el archivo localmente"""
+    return {"peer": LOCAL_PEER_NAME, "filename": filename, "found": peer_files.has(LOCAL_PEER_NAME, filename)}
+
+@app.post("/has/batch")
+async def has_files(data: dict = Body(...)):
+    """Confirmar cuáles de los archivos pedidos tiene este peer localmente"""
+    filenames = data.get("filenames", [])
+    return {"peer": LOCAL_PEER_NAME, "found": [f for f in filenames if peer_files.has(LOCAL_PEER_NAME, f)]}
 
 
 # --------- Endpoint /locate ----------
@@ -48,103 +223,838 @@ async def list_files():
 async def locate_file(filename: str = Query(...)):
     """
     Localizar un archivo en la red de peers.
-    Consulta a todos los peers para ver quién tiene el archivo.
+    El motor depende de locate_mode: "query" pregunta a los peers remotos,
+    "dht" busca los registros de proveedores en la DHT.
+    Los resultados se cachean por un tiempo corto.
     """
-    sources = []
+    return (await _locate_many([filename]))[0]
+
+@app.post("/locate/batch")
+async def locate_batch(data: dict = Body(...)):
+    """
+    Localizar muchos archivos a la vez.
+    Requiere JSON: {"filenames": ["a.txt", "b.txt", ...]}
+    Se resuelven todos con una sola ronda de consultas a los peers.
+    """
+    filenames = data.get("filenames")
+    if not isinstance(filenames, list) or not filenames:
+        return {"error": "Se requiere una lista 'filenames'"}
+    return {"results": await _locate_many(filenames)}
+
+async def _locate_many(filenames):
+    """Resolver una lista de archivos: primero la caché, el resto con el motor configurado"""
+    filenames = list(dict.fromkeys(filenames))
+    results = {}
+    pending = []
+    for filename in filenames:
+        cached = locate_cache.get(filename)
+        if cached is not None:
+            results[filename] = cached
+        else:
+            pending.append(filename)
+
+    remote = {filename: [] for filename in pending}
+    if pending:
+        async with aclosing(LOCATE_ENGINES[LOCATE_MODE](pending)) as found:
+            async for filename, p in found:
+                remote[filename].append(p)
+
+    for filename in pending:
+        sources = []
+
+        # Revisar peer local
+        if peer_files.has(LOCAL_PEER_NAME, filename):
+            sources.append({
+                "peer": LOCAL_PEER_NAME,
+                "download_url": f"{LOCAL_PEER_URL}/download/{filename}"
+            })
+
+        for p in remote[filename]:
+            sources.append({
+                "peer": p["name"],
+                "download_url": f"{p['url']}/download/{filename}"
+            })
+
+        if sources:
+            result = {"found": True, "filename": filename, "sources": sources}
+        else:
+            result = {"found": False, "filename": filename}
+        locate_cache.put(filename, result)
+        results[filename] = result
+
+    # El ranking se calcula al responder: las estadísticas cambian más rápido que la caché
+    for filename in filenames:
+        if results[filename]["found"]:
+            sources = _rank_sources(results[filename]["sources"])
+            if sources:
+                results[filename]["sources"] = sources
+            else:
+                results[filename] = {"found": False, "filename": filename}
+    return [results[filename] for filename in filenames]
+
+def _rank_sources(sources):
+    """
+    La fuente local primero y luego las remotas de la más rápida a la más lenta.
+    Se omiten los peers con el circuito abierto.
+    """
+    local = [s for s in sources if s["peer"] == LOCAL_PEER_NAME]
+    remote = [s for s in sources if s["peer"] != LOCAL_PEER_NAME and breaker.allow(s["peer"])]
+    return local + peer_stats.rank(remote)
+
+async def _locate_by_query(filenames):
+    """
+    Preguntar a los peers remotos, pero a cada uno solo por los archivos
+    que según su filtro de Bloom podría tener (una petición por peer).
+    Va entregando (archivo, peer) a medida que cada peer responde.
+    """
+    # En paralelo, con deadline global para todo el locate
+    deadline = time.monotonic() + LOCATE_DEADLINE
+    # Los filtros vencidos se piden en segundo plano: un peer lento no se
+    # come el deadline del locate, solo deja de aprovechar su filtro esta vez
+    _refresh_summaries_soon()
+
+    now = time.monotonic()
+    wanted = {}
+    candidates = []
+    for p in _remote_peers():
+        summary = peer_summaries.get(p["name"])
+        # Sin resumen vigente no podemos descartar al peer: se le pregunta por todo
+        if summary is None or now - summary[0] > SUMMARY_TTL:
+            names = filenames
+        else:
+            names = [f for f in filenames if summary[1].might_contain(f)]
+        if names:
+            wanted[p["name"]] = names
+            candidates.append(p)
+
+    async def _fetch_has(p: dict):
+        resp = await http_client.post(f"{p['url']}/has/batch", json={"filenames": wanted[p["name"]]})
+        resp.raise_for_status()
+        return resp.json().get("found", [])
+
+    requested = set(filenames)
+    async with aclosing(_iter_peers(_fetch_has, max(deadline - time.monotonic(), 0), candidates)) as replies:
+        async for p, found in replies:
+            for filename in found:
+                if filename in requested:
+                    yield filename, p
+
+async def _locate_by_dht(filenames):
+    """
+    Buscar en la DHT los peers que publicaron cada archivo (O(log N) saltos).
+    Cada archivo tiene su propia clave, así que las búsquedas van en paralelo
+    y se entrega (archivo, peer) apenas termina la de cada archivo.
+    """
+    async def lookup(filename: str):
+        key = key_for(filename)
+        providers = {p["name"]: p for p in dht_providers.get(key)}
+        try:
+            _, found = await asyncio.wait_for(
+                iterative_lookup(dht_table, key, _dht_rpc, find_providers=True), LOCATE_DEADLINE
+            )
+            providers.update((p["name"], p) for p in found)
+        except asyncio.TimeoutError:
+            pass
+        return filename, [p for name, p in providers.items() if name != LOCAL_PEER_NAME]
+
+    tasks = [asyncio.create_task(lookup(f)) for f in filenames]
+    try:
+        for lookup_done in asyncio.as_completed(tasks):
+            filename, providers = await lookup_done
+            for p in providers:
+                yield filename, p
+    finally:
+        for task in tasks:
+            task.cancel()
+
+LOCATE_ENGINES = {
+    "query": _locate_by_query,
+    "dht": _locate_by_dht,
+}
+
+@app.get("/locate/stream")
+async def locate_stream(filename: str = Query(...), k: int = Query(None), format: str = Query("ndjson")):
+    """
+    Localizar un archivo enviando cada fuente apenas un peer la confirma,
+    como NDJSON (una línea por fuente) o como server-sent events (format=sse).
+    Con k se corta después de las primeras k fuentes (k <= 0 es sin límite).
+    """
+    def encode(event: str, data: dict):
+        if format == "sse":
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps(data) + "\n"
 
-    # Revisar peer local
-    if filename in peer_files[LOCAL_PEER_NAME]:
+    async def events():
+        count = 0
+        async with aclosing(_iter_sources(filename, k)) as sources:
+            async for source in sources:
+                count += 1
+                yield encode("source", source)
+        yield encode("done", {"done": True, "filename": filename, "found": count > 0})
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+async def _iter_sources(filename: str, k: int = None):
+    """
+    Entregar las fuentes de un archivo a medida que se conocen: primero la local,
+    luego cada peer remoto cuando confirma. Si se recorren todas se cachea el resultado.
+    Con k se entregan como mucho k fuentes; k = None o k <= 0 es sin límite.
+    """
+    if k is not None and k <= 0:
+        k = None
+    cached = locate_cache.get(filename)
+    if cached is not None:
+        for source in _rank_sources(cached.get("sources", []))[:k]:
+            yield source
+        return
+
+    sources = []
+    if peer_files.has(LOCAL_PEER_NAME, filename):
         sources.append({
             "peer": LOCAL_PEER_NAME,
             "download_url": f"{LOCAL_PEER_URL}/download/{filename}"
         })
+        yield sources[-1]
+        if k is not None and len(sources) >= k:
+            return
 
-    # Revisar peers remotos
-    for p in config.get("peers", []):
-        try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{p['url']}/files")
-                resp.raise_for_status()
-                remote_files = resp.json().get("peer_files", {}).get(p["name"], [])
-                if filename in remote_files:
-                    sources.append({
-                        "peer": p["name"],
-                        "download_url": f"{p['url']}/download/{filename}"
-                    })
-        except Exception as e:
-            # Ignorar peers que no respondan
-            continue
+    async with aclosing(LOCATE_ENGINES[LOCATE_MODE]([filename])) as found:
+        async for _, p in found:
+            sources.append({
+                "peer": p["name"],
+                "download_url": f"{p['url']}/download/{filename}"
+            })
+            yield sources[-1]
+            if k is not None and len(sources) >= k:
+                return
 
     if sources:
-        return {"found": True, "filename": filename, "sources": sources}
+        locate_cache.put(filename, {"found": True, "filename": filename, "sources": sources})
     else:
-        return {"found": False, "filename": filename}
+        locate_cache.put(filename, {"found": False, "filename": filename})
 
 # --------- Endpoint /download ----------
 @app.get("/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request):
     """
     Descargar un archivo.
-    Primero lo localiza en la red y luego lo descarga desde la URL obtenida.
+    Si la ubicación está en caché usa la fuente mejor rankeada; si no,
+    empieza a transferir desde el primer peer que confirma tenerlo.
+    Acepta Range/If-Range (respuesta 206) tanto para archivos locales
+    como para los que se traen de otro peer.
+    Los pedidos simultáneos del archivo completo comparten una sola
+    transferencia, que al terminar queda en proxy_cache para los siguientes.
     """
-    location_data = await locate_file(filename)
-
-    if not location_data.get("found"):
-        return Response(content=json.dumps({"error": "Archivo no encontrado"}), status_code=404, media_type="application/json")
-
-    # Tomar la primera fuente disponible
-    source = location_data["sources"][0]
-    download_url = source["download_url"]
-
-    # Si la URL es local, servir el archivo directamente
-    if source["peer"] == LOCAL_PEER_NAME:
+    # Si el archivo es local, servirlo directamente (FileResponse atiende el Range)
+    if peer_files.has(LOCAL_PEER_NAME, filename):
         file_path = os.path.join(DIRECTORY, filename)
         if os.path.exists(file_path):
             return FileResponse(file_path, filename=filename)
+        manifest = chunk_store.manifest(filename) if chunk_store is not None else None
+        if manifest is not None:
+            return _stored_file_response(manifest, request)
         else:
             return Response(content=json.dumps({"error": "Archivo no encontrado localmente"}), status_code=404, media_type="application/json")
 
-    # Si es remota, descargar y transmitir usando el generador
-    return StreamingResponse(_stream_remote_file(download_url), media_type="text/plain")
+    cached = proxy_cache.get(filename)
+    if cached is not None:
+        # Con el ETag del peer de origen, para que If-Range siga funcionando
+        headers = {"etag": cached.get("etag"), "last-modified": cached.get("last_modified")}
+        headers = {k: v for k, v in headers.items() if v}
+        return FileResponse(cached["path"], filename=filename, headers=headers)
+
+    range_headers = {k: request.headers[k] for k in ("range", "if-range") if k in request.headers}
+    if not range_headers:
+        return await _download_coalesced(filename)
+
+    # Un rango de un archivo remoto: reenviarlo al peer y transmitir su respuesta
+    source = await _first_source(filename)
+    if source is None:
+        return Response(content=json.dumps({"error": "Archivo no encontrado"}), status_code=404, media_type="application/json")
+    try:
+        upstream, rtt = await _open_remote_file(source["download_url"], source["peer"], range_headers)
+    except Exception as e:
+        return JSONResponse({"error": f"No se pudo contactar al peer: {e}"}, status_code=502)
+
+    headers = {k: upstream.headers[k] for k in PROXIED_HEADERS if k in upstream.headers}
+    if upstream.status_code not in (200, 206):
+        # p. ej. 416 si el rango no es válido: se devuelve tal cual
+        await _discard_upstream(upstream, source["peer"])
+        return Response(content=upstream.content, status_code=upstream.status_code, headers=headers)
+
+    return StreamingResponse(
+        _stream_remote_file(upstream, source["peer"], rtt),
+        status_code=upstream.status_code,
+        headers=headers,
+        media_type=upstream.headers.get("content-type", "text/plain"),
+    )
+
+def _stored_file_response(manifest: dict, request: Request):
+    """
+    Servir un archivo del almacén de chunks, rearmándolo al vuelo.
+    Como FileResponse, atiende un Range de un solo rango (If-Range por ETag);
+    el ETag es la versión del manifiesto.
+    """
+    filename = manifest["filename"]
+    size = manifest["size"]
+    etag = f'"{manifest["version"]}"'
+    quoted = quote(filename)
+    headers = {
+        "etag": etag,
+        "accept-ranges": "bytes",
+        "content-disposition": f'attachment; filename="{filename}"' if quoted == filename
+        else f"attachment; filename*=utf-8''{quoted}",
+    }
+    media_type = mimetypes.guess_type(filename)[0] or "text/plain"
+
+    byte_range = _parse_range(request.headers.get("range"), size)
+    if byte_range is not None and request.headers.get("if-range", etag) == etag:
+        start, end = byte_range
+        if start >= end:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+        headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+        headers["content-length"] = str(end - start)
+        # Generador síncrono: Starlette lo recorre en un hilo
+        return StreamingResponse(
+            chunk_store.read(manifest, start, end - start), status_code=206, headers=headers, media_type=media_type
+        )
+    headers["content-length"] = str(size)
+    return StreamingResponse(chunk_store.read(manifest), headers=headers, media_type=media_type)
+
+def _parse_range(header: str, size: int):
+    """
+    (inicio, fin) de un header Range "bytes=a-b", "bytes=a-" o "bytes=-n", con fin
+    exclusivo (inicio >= fin si no se puede satisfacer). None si no hay Range o
+    se ignora (mal formado o con varios rangos): se responde el archivo completo.
+    """
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last) + 1, size) if last else size
+        else:
+            start = max(size - int(last), 0)
+            end = size
+    except ValueError:
+        return None
+    return start, end
+
+async def _download_coalesced(filename: str):
+    """
+    Sumarse a la transferencia en curso de filename, o iniciarla.
+    Cada pedido lee el spool compartido a su propio ritmo.
+    """
+    flight, reader, leader = flights.join(filename)
+    if leader:
+        # La transferencia no depende de quien la inició: sigue aunque ese cliente se vaya
+        _spawn(_run_flight(filename, flight))
+
+    meta = await flight.wait_ready()
+    if meta is None:
+        reader.close()
+        return JSONResponse({"error": f"No se pudo contactar al peer: {flight.error}"}, status_code=502)
+    if meta["status_code"] != 200:
+        reader.close()
+        return Response(content=meta["body"], status_code=meta["status_code"], headers=meta["headers"])
+    return StreamingResponse(flight.read(reader), headers=meta["headers"], media_type=meta["media_type"])
+
+async def _run_flight(filename: str, flight: Flight):
+    """Localizar el archivo y bombearlo desde su peer al spool de la transferencia"""
+    error = "Transferencia interrumpida"
+    peer = None
+    try:
+        source = await _first_source(filename)
+        if source is None:
+            flight.start(status_code=404, headers={}, body=json.dumps({"error": "Archivo no encontrado"}))
+        else:
+            peer = source["peer"]
+            upstream, rtt = await _open_remote_file(source["download_url"], peer)
+            headers = {k: upstream.headers[k] for k in PROXIED_HEADERS if k in upstream.headers}
+            if upstream.status_code != 200:
+                await _discard_upstream(upstream, peer)
+                flight.start(status_code=upstream.status_code, headers=headers, body=upstream.content)
+            else:
+                flight.start(
+                    status_code=200, headers=headers,
+                    media_type=upstream.headers.get("content-type", "text/plain"),
+                )
+                async for chunk in _stream_remote_file(upstream, peer, rtt):
+                    await flight.write(chunk)
+        error = None
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    finally:
+        flight.finish(error)
+        flights.leave(filename, flight)
+
+        # Los lectores ya tienen el spool abierto: se puede mover a la caché o
+        # borrar (también si la tarea se canceló)
+        if error is None and flight.meta["status_code"] == 200 and proxy_cache.fits(flight.size):
+            headers = flight.meta["headers"]
+            proxy_cache.add(
+                filename, flight.path, flight.size,
+                peer=peer, etag=headers.get("etag"), last_modified=headers.get("last-modified"),
+            )
+        else:
+            os.remove(flight.path)
+
+async def _first_source(filename: str):
+    async with aclosing(_iter_sources(filename, k=1)) as sources:
+        return await anext(sources, None)
+
+async def _discard_upstream(upstream: httpx.Response, peer: str):
+    """Leer y cerrar una respuesta de error del peer; un 5xx cuenta como fallo"""
+    if upstream.status_code >= 500:
+        peer_stats.record_failure(peer)
+        breaker.record_failure(peer)
+    await upstream.aread()
+    await upstream.aclose()
+
+# Headers del peer remoto que se conservan al reenviar una descarga
+PROXIED_HEADERS = ("content-length", "content-range", "accept-ranges", "etag", "last-modified", "content-disposition")
+
+# --------- Endpoint /swarm_download ----------
+@app.post("/swarm_download")
+async def swarm_download_file(data: dict = Body(...)):
+    """
+    Traer un archivo a la carpeta compartida pidiendo rangos a todos los
+    peers que lo tienen a la vez.
+    Requiere JSON: {"filename": "video.mp4"}
+    Al terminar el archivo queda registrado como local (una fuente más).
+    """
+    filename = data.get("filename")
+    if not filename:
+        return {"error": "Se requiere 'filename'"}
+    if peer_files.has(LOCAL_PEER_NAME, filename):
+        return {"status": "ya existe", "filename": filename}
+
+    async with aclosing(_iter_sources(filename)) as found:
+        sources = [s async for s in found if s["peer"] != LOCAL_PEER_NAME]
+    if not sources:
+        return JSONResponse({"error": "Archivo no encontrado"}, status_code=404)
+
+    # Solo sirven las fuentes que aceptan rangos y coinciden en el tamaño
+    sizes = await asyncio.gather(*(probe_size(http_client, s["download_url"]) for s in sources), return_exceptions=True)
+    by_size = {}
+    for source, size in zip(sources, sizes):
+        if isinstance(size, int):
+            by_size.setdefault(size, []).append(source)
+    if not by_size:
+        return JSONResponse({"error": "Ninguna fuente acepta descargas por rango"}, status_code=502)
+    size, sources = max(by_size.items(), key=lambda item: len(item[1]))
+
+    def on_success(peer: str, nbytes: int, seconds: float):
+        peer_stats.record_success(peer, nbytes=nbytes, seconds=seconds)
+        breaker.record_success(peer)
+
+    def on_failure(peer: str, error: Exception):
+        peer_stats.record_failure(peer)
+        _breaker_record(peer, error)
+
+    # Se arma en un temporal propio y se publica al terminar: nunca queda un
+    # archivo a medias y dos descargas simultáneas del mismo archivo no se pisan
+    staged = await asyncio.to_thread(StagedFile, DIRECTORY, filename)
+    start = time.monotonic()
+    try:
+        fetched = await swarm_download(
+            http_client, sources, staged.temp_path, size,
+            piece_size=SWARM_PIECE_SIZE, per_source=SWARM_PER_SOURCE,
+            on_success=on_success, on_failure=on_failure,
+        )
+        seconds = time.monotonic() - start
+        await asyncio.to_thread(staged.commit, chunk_store)
+    except SwarmError as e:
+        return JSONResponse({"error": str(e)}, status_code=502)
+    finally:
+        # Tras un commit no queda temporal; con cualquier error (o si se cancela) se borra
+        await asyncio.to_thread(staged.abort)
+
+    await _register_local(filename)
+    return {
+        "status": "ok",
+        "filename": filename,
+        "size": size,
+        "seconds": round(seconds, 3),
+        "sources": fetched,
+    }
+
+
+# --------- Transferencia por chunks ----------
+@app.get("/manifest/{filename}")
+async def file_manifest(filename: str):
+    """
+    Manifiesto de un archivo local: tamaño, versión y lista de chunks
+    [[sha256, tamaño], ...] según content-defined chunking.
+    Para los archivos fuera del almacén se calcula al pedirlo y se recuerda
+    mientras el archivo no cambie.
+    """
+    manifest = await asyncio.to_thread(_local_manifest, filename)
+    if manifest is None:
+        return JSONResponse({"error": "Archivo no encontrado localmente"}, status_code=404)
+    return manifest
+
+@app.get("/chunk/{digest}")
+async def get_chunk(digest: str):
+    """Datos de un chunk por su sha256 (del almacén o de un archivo con manifiesto ya calculado)"""
+    if not is_digest(digest):
+        return JSONResponse({"error": "Hash inválido"}, status_code=400)
+    data = await asyncio.to_thread(_read_local_chunk, digest)
+    if data is None:
+        return JSONResponse({"error": "Chunk no encontrado"}, status_code=404)
+    return Response(content=data, media_type="application/octet-stream")
+
+@app.post("/chunked_download")
+async def chunked_download_file(data: dict = Body(...)):
+    """
+    Traer (o actualizar) un archivo en el almacén de chunks transfiriendo solo
+    lo que falta: se pide el manifiesto a una fuente, se ve qué chunks no
+    están ya en el almacén (de otros archivos o de la versión anterior) y
+    solo esos se descargan, verificando su sha256.
+    Requiere JSON: {"filename": "app.log"} y storage_engine = "chunks".
+    """
+    filename = data.get("filename")
+    if not filename:
+        return {"error": "Se requiere 'filename'"}
+    if chunk_store is None:
+        return JSONResponse({"error": "Este peer no usa el almacén de chunks"}, status_code=400)
+
+    async with aclosing(_iter_sources(filename)) as found:
+        sources = [s async for s in found if s["peer"] != LOCAL_PEER_NAME]
+    if not sources:
+        return JSONResponse({"error": "Archivo no encontrado"}, status_code=404)
+
+    error = None
+    for source in sources:
+        base_url = source["download_url"].rsplit("/download/", 1)[0]
+        try:
+            result = await _fetch_by_chunks(source["peer"], base_url, filename)
+        except Exception as e:
+            error = e
+            continue
+        if result["status"] == "ok":
+            await _register_local(filename)
+        return result
+    return JSONResponse({"error": f"No se pudo traer el archivo: {error}"}, status_code=502)
+
+@app.get("/chunk_store")
+async def chunk_store_status():
+    """Archivos, chunks y bytes del almacén (lógicos vs. guardados: lo que ahorra la deduplicación)"""
+    if chunk_store is None:
+        return {"engine": STORAGE_ENGINE}
+    return {"engine": STORAGE_ENGINE, **await asyncio.to_thread(chunk_store.to_dict)}
+
+def _local_manifest(filename: str):
+    path = os.path.join(DIRECTORY, filename)
+    if os.path.isfile(path):
+        return file_chunker.manifest(filename, path)
+    if chunk_store is not None:
+        return chunk_store.manifest(filename)
+    return None
+
+def _read_local_chunk(digest: str):
+    if chunk_store is not None:
+        try:
+            return chunk_store.read_chunk(digest)
+        except FileNotFoundError:
+            pass
+    return file_chunker.read_chunk(digest)
+
+async def _fetch_by_chunks(peer: str, base_url: str, filename: str):
+    """Traer filename desde el peer en base_url pidiendo solo los chunks que faltan"""
+    start = time.monotonic()
+    # El peer puede tener que calcular el manifiesto: sin read timeout
+    manifest = await _timed_call(peer, _get_json(
+        f"{base_url}/manifest/{filename}", timeout=httpx.Timeout(PEER_TIMEOUT, read=None)
+    ))
+    local = await asyncio.to_thread(chunk_store.manifest, filename)
+    if local is not None and local["version"] == manifest["version"]:
+        return {"status": "ya existe", "filename": filename, "version": local["version"]}
 
+    # El manifiesto viene de otro peer: se valida antes de usar sus tamaños
+    sizes = chunk_sizes(manifest.get("chunks"))
+    fetched = []
+    for attempt in range(2):
+        missing = await asyncio.to_thread(chunk_store.missing, list(sizes))
+        await _fetch_chunks(peer, base_url, {digest: sizes[digest] for digest in missing})
+        fetched += missing
+        try:
+            stored = await asyncio.to_thread(chunk_store.commit, filename, manifest["chunks"])
+            break
+        except ChunkStoreError:
+            # Se borró un chunk que ya estaba (otro archivo lo soltó): pedir lo que falte
+            if attempt:
+                raise
+    # Una copia vieja fuera del almacén taparía a la nueva
+    try:
+        os.remove(os.path.join(DIRECTORY, filename))
+    except FileNotFoundError:
+        pass
+
+    bytes_fetched = sum(sizes[digest] for digest in fetched)
+    return {
+        "status": "ok",
+        "filename": filename,
+        "size": stored["size"],
+        "version": stored["version"],
+        "source": peer,
+        "chunks": len(manifest["chunks"]),
+        "fetched_chunks": len(fetched),
+        "bytes_fetched": bytes_fetched,
+        "bytes_reused": max(stored["size"] - bytes_fetched, 0),
+        "seconds": round(time.monotonic() - start, 3),
+    }
+
+async def _fetch_chunks(peer: str, base_url: str, sizes: dict):
+    """
+    Descargar esos chunks ({sha256: tamaño}) del peer (CHUNK_FETCH_CONCURRENCY a
+    la vez) y guardarlos en el almacén tras verificar tamaño y hash
+    """
+    limit = asyncio.Semaphore(CHUNK_FETCH_CONCURRENCY)
+
+    async def fetch(digest: str, size: int):
+        async with limit:
+            resp = await _timed_call(peer, http_client.get(f"{base_url}/chunk/{digest}"))
+            resp.raise_for_status()
+            await asyncio.to_thread(chunk_store.add_chunk, digest, resp.content, size)
+
+    tasks = [asyncio.create_task(fetch(digest, size)) for digest, size in sizes.items()]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # Si uno falla no tiene sentido seguir con el resto
+        for task in tasks:
+            task.cancel()
 
 # --------- Endpoint /upload ----------
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request):
     """
-    Subir un archivo al peer local.
-    Se guarda en el directorio compartido y se registra en peer_files.
+    Subir un archivo al peer local (multipart/form-data, campo "file").
+    Se guarda en el directorio compartido (en el almacén de chunks si
+    storage_engine = "chunks") y se registra en peer_files.
+
+    El cuerpo se procesa a medida que llega, en bloques de hasta
+    UPLOAD_CHUNK_SIZE que se escriben a disco desde un hilo: la memoria por
+    subida es constante y el event loop sigue atendiendo los demás pedidos.
+    Si el archivo pasa de UPLOAD_MAX_BYTES se corta y se responde 413.
+    Con replication_factor > 1, al terminar se copia en segundo plano a
+    otros peers (ver _replicate).
     """
-    file_path = os.path.join(DIRECTORY, file.filename)
     try:
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
-        if file.filename not in peer_files[LOCAL_PEER_NAME]:
-            peer_files[LOCAL_PEER_NAME].append(file.filename)
+        writer = MultipartFileWriter(
+            request.headers.get("content-type", ""), DIRECTORY, max_bytes=UPLOAD_MAX_BYTES, store=chunk_store
+        )
+    except UploadError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
 
-            await refresh_files()
-        return {"status": "ok", "filename": file.filename}
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(writer.feed, bytes(buffer))
+                buffer.clear()
+        await asyncio.to_thread(writer.feed, bytes(buffer))
+        filename, _ = await asyncio.to_thread(writer.finish)
+    except UploadTooLarge as e:
+        await asyncio.to_thread(writer.abort)
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except UploadError as e:
+        await asyncio.to_thread(writer.abort)
+        return JSONResponse({"error": str(e)}, status_code=400)
     except Exception as e:
+        await asyncio.to_thread(writer.abort)
         return {"error": str(e)}
 
-# --------- Helper para streaming ----------
-async def _stream_remote_file(url: str):
+    # La nueva versión del catálogo se difunde en la siguiente ronda de gossip
+    await _register_local(filename)
+    if REPLICATION_FACTOR > 1:
+        _spawn(_replicate(filename))
+    return {"status": "ok", "filename": filename}
+
+async def _register_local(filename: str):
+    """
+    Registrar en el catálogo un archivo local nuevo o actualizado.
+    La versión sube aunque el nombre ya estuviera, así el delta avisa a los
+    demás peers que descarten su copia cacheada.
+    """
+    locate_cache.invalidate([filename])
+    await asyncio.to_thread(proxy_cache.invalidate, [filename])
+    if peer_files.touch(LOCAL_PEER_NAME, filename) and LOCATE_MODE == "dht":
+        _spawn(_dht_publish(filename))
+
+# --------- Réplicas ----------
+@app.post("/replica/{filename}")
+async def receive_replica(filename: str, request: Request):
+    """
+    Recibir la réplica de un archivo subido en otro peer (el cuerpo es el archivo).
+    Si el header x-replica-chain trae más peers, cada bloque se reenvía al
+    siguiente apenas llega (réplica en cadena): la última copia no espera a
+    que terminen las anteriores. Responde los peers de la cadena que lo guardaron.
+    """
+    try:
+        chain = json.loads(request.headers.get("x-replica-chain", "[]"))
+    except ValueError:
+        chain = None
+    if not isinstance(chain, list) or not all(isinstance(url, str) for url in chain):
+        return JSONResponse({"error": "Header x-replica-chain inválido"}, status_code=400)
+    staged = await asyncio.to_thread(StagedFile, DIRECTORY, filename)
+    queue = asyncio.Queue(maxsize=CHAIN_QUEUE_SIZE)
+    forward = asyncio.create_task(_forward_replica(filename, chain, queue)) if chain else None
+    try:
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= UPLOAD_CHUNK_SIZE:
+                data = bytes(buffer)
+                buffer.clear()
+                await asyncio.to_thread(staged.write, data)
+                if forward is not None:
+                    await offer(queue, forward, data)
+        if buffer:
+            await asyncio.to_thread(staged.write, bytes(buffer))
+            if forward is not None:
+                await offer(queue, forward, bytes(buffer))
+        if forward is not None:
+            await offer(queue, forward, None)
+        await asyncio.to_thread(staged.commit, chunk_store)
+    except Exception as e:
+        # El siguiente peer ve el cuerpo cortado y también descarta su copia
+        if forward is not None:
+            forward.cancel()
+        await asyncio.to_thread(staged.abort)
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    await _register_local(filename)
+    replicas = [LOCAL_PEER_NAME]
+    if forward is not None:
+        try:
+            replicas += await forward
+        except Exception:
+            pass  # la cadena se cortó más adelante: quien la inició reintenta con otros peers
+    return {"status": "ok", "filename": filename, "replicas": replicas}
+
+async def _forward_replica(filename: str, chain, queue: asyncio.Queue):
+    """Reenviar al siguiente peer de la cadena los bloques que llegan por queue"""
+    resp = await http_client.post(
+        f"{chain[0]}/replica/{quote(filename)}",
+        content=queue_items(queue),
+        headers={"x-replica-chain": json.dumps(chain[1:])},
+        timeout=httpx.Timeout(PEER_TIMEOUT, read=None),
+    )
+    resp.raise_for_status()
+    return resp.json().get("replicas", [])
+
+async def _replicate(filename: str):
+    """
+    Copiar un archivo recién subido a REPLICATION_FACTOR - 1 peers más y
+    traer el catálogo de los que lo guardaron, así /locate los ofrece como
+    fuentes y las descargas se reparten entre ellas.
+    El archivo se manda una sola vez, al primer peer de la cadena. Si la
+    cadena se corta, se reintenta una vez con otros peers para las que faltan.
+    """
+    stored = []
+    tried = set()
+    for _ in range(2):
+        candidates = [p for p in _remote_peers() if p["name"] not in tried and breaker.allow(p["name"])]
+        targets = pick_replicas(
+            filename, candidates, REPLICATION_FACTOR - 1 - len(stored), REPLICATION_STRATEGY,
+            rank=lambda peers: peer_stats.rank(peers, key=lambda p: p["name"]),
+        )
+        if not targets:
+            break
+        try:
+            replicas = await _push_replica(filename, targets)
+        except Exception:
+            replicas = []
+        # Los peers de la cadena después del que falló no recibieron nada: pueden volver a elegirse
+        tried.update(p["name"] for p in targets[:len(replicas) + 1])
+        stored += replicas
+        if len(stored) >= REPLICATION_FACTOR - 1:
+            break
+    if stored:
+        # Cada réplica registra el archivo con su propia versión de catálogo:
+        # se trae su delta en vez de tocar a mano la entrada de otro peer
+        await _query_peers(_sync_remote_catalog, LOCATE_DEADLINE, [p for p in _remote_peers() if p["name"] in stored])
+    return stored
+
+async def _push_replica(filename: str, targets):
+    """Mandar el archivo local al primero de targets, con el resto como cadena"""
+    f = await asyncio.to_thread(_open_local, filename)
+    if f is None:
+        return []
+
+    async def body():
+        try:
+            while data := await asyncio.to_thread(f.read, UPLOAD_CHUNK_SIZE):
+                yield data
+        finally:
+            await asyncio.to_thread(f.close)
+
+    first = targets[0]
+    resp = await _timed_call(first["name"], http_client.post(
+        f"{first['url']}/replica/{quote(filename)}",
+        content=body(),
+        headers={"x-replica-chain": json.dumps([p["url"] for p in targets[1:]])},
+        timeout=httpx.Timeout(PEER_TIMEOUT, read=None),
+    ))
+    resp.raise_for_status()
+    return resp.json().get("replicas", [])
+
+def _open_local(filename: str):
+    """La versión local de filename abierta para leer (de la carpeta o del almacén), o None"""
+    try:
+        return open(os.path.join(DIRECTORY, filename), "rb")
+    except FileNotFoundError:
+        return chunk_store.open(filename) if chunk_store is not None else None
+
+# --------- Helpers para streaming ----------
+async def _open_remote_file(url: str, peer: str = None, headers: dict = None):
     """
-    Un generador asíncrono para descargar y transmitir un archivo desde una URL.
-    Maneja el ciclo de vida del cliente httpx para el streaming.
+    Pedir un archivo a un peer remoto y devolver (respuesta, rtt) con el cuerpo
+    aún sin leer, para conocer el status y los headers antes de transmitir.
+    El read timeout se desactiva para archivos grandes.
     """
+    start = time.monotonic()
+    request = http_client.build_request(
+        "GET", url, headers=headers, timeout=httpx.Timeout(PEER_TIMEOUT, read=None)
+    )
     try:
-        async with httpx.AsyncClient() as client:
-            async with client.stream("GET", url) as r:
-                r.raise_for_status()
-                async for chunk in r.aiter_bytes():
-                    yield chunk
-    except httpx.HTTPStatusError as e:
-        error_message = json.dumps({"error": f"Failed to download file from peer: {e}"})
-        yield error_message.encode('utf-8')
+        resp = await http_client.send(request, stream=True)
     except Exception as e:
-        error_message = json.dumps({"error": f"An unexpected error occurred: {str(e)}"})
-        yield error_message.encode('utf-8')
+        if peer:
+            peer_stats.record_failure(peer)
+            _breaker_record(peer, e)
+        raise
+    return resp, time.monotonic() - start
+
+async def _stream_remote_file(resp: httpx.Response, peer: str = None, rtt: float = None):
+    """
+    Un generador asíncrono que transmite el cuerpo de una respuesta abierta con
+    _open_remote_file y registra la velocidad del peer en peer_stats.
+    Si la transferencia se corta se propaga el error: el cliente ve la respuesta
+    incompleta (Content-Length) y puede reanudar con Range.
+    """
+    start = time.monotonic()
+    nbytes = 0
+    try:
+        async for chunk in resp.aiter_bytes():
+            nbytes += len(chunk)
+            yield chunk
+    except Exception as e:
+        if peer:
+            peer_stats.record_failure(peer)
+            _breaker_record(peer, e)
+        raise
+    finally:
+        await resp.aclose()
+    if peer:
+        peer_stats.record_success(peer, rtt=rtt, nbytes=nbytes, seconds=time.monotonic() - start + (rtt or 0))
+        breaker.record_success(peer)
 
 # --------- Endpoint /add_peer ----------
 @app.post("/add_peer")
@@ -162,7 +1072,9 @@ async def add_peer(peer: dict = Body(...)):
     with open(CONFIG_PATH, "w") as f:
         json.dump(config, f, indent=4)
 
-    await refresh_files()
+    membership.add_seed(peer)
+    locate_cache.invalidate()
+    await _query_peers(_sync_remote_catalog, LOCATE_DEADLINE, [peer])
     return {"status": "ok", "peers": config["peers"]}
 
 # --------- Endpoint /add_file ----------
@@ -173,12 +1085,11 @@ async def add_file(data: dict = Body(...)):
     filename = data.get("filename")
     if not peer or not filename:
         return {"error": "Se requieren 'peer' y 'filename'"}
-    peer_files.setdefault(peer, [])
-    if filename not in peer_files[peer]:
-        peer_files[peer].append(filename)
-        return {"status": "ok", "peer": peer, "files": peer_files[peer]}
+    locate_cache.invalidate([filename])
+    if peer_files.add(peer, filename):
+        return {"status": "ok", "peer": peer, "files": peer_files.files_of(peer)}
     else:
-        return {"status": "ya existe", "peer": peer, "files": peer_files[peer]}
+        return {"status": "ya existe", "peer": peer, "files": peer_files.files_of(peer)}
 
 # --------- Endpoint /peers ----------
 @app.get("/peers")
@@ -186,26 +1097,75 @@ async def list_peers():
     """Listar los peers conocidos por este nodo"""
     return {"peers": config.get("peers", [])}
 
+@app.get("/peers/stats")
+async def peers_stats():
+    """
+    RTT, throughput y tasa de error (EWMA) de cada peer, su costo estimado
+    y el estado de su circuit breaker.
+    """
+    return {"stats": peer_stats.to_dict(), "breakers": breaker.to_dict()}
+
+@app.get("/proxy_cache")
+async def proxy_cache_status():
+    """Archivos remotos cacheados en disco, con su tamaño, origen y aciertos"""
+    return proxy_cache.to_dict()
+
+@app.delete("/proxy_cache")
+async def proxy_cache_clear():
+    """Vaciar la caché de archivos remotos"""
+    await asyncio.to_thread(proxy_cache.invalidate)
+    return {"status": "ok"}
+
+# --------- Endpoints de gossip ----------
+@app.post("/gossip")
+async def gossip(data: dict = Body(...)):
+    """
+    Intercambio push-pull: mezclar la vista del peer que llama
+    y responder con la vista local.
+    """
+    _on_catalog_changes(membership.merge(data.get("members", [])))
+    return {"members": membership.digest()}
+
+@app.get("/members")
+async def list_members():
+    """Vista de membresía de este nodo (heartbeat, versión y estado de cada peer)"""
+    return {"members": membership.to_dict()}
+
+# --------- Endpoints de la DHT ----------
+@app.post("/dht/find_node")
+async def dht_find_node(data: dict = Body(...)):
+    """Devolver los k contactos más cercanos a la clave"""
+    dht_table.update(data.get("sender", {}))
+    return {"nodes": dht_table.closest(int(data["key"], 16))}
+
+@app.post("/dht/find_providers")
+async def dht_find_providers(data: dict = Body(...)):
+    """Devolver los proveedores conocidos de la clave, o los contactos más cercanos"""
+    dht_table.update(data.get("sender", {}))
+    key = int(data["key"], 16)
+    return {"providers": dht_providers.get(key), "nodes": dht_table.closest(key)}
+
+@app.post("/dht/add_provider")
+async def dht_add_provider(data: dict = Body(...)):
+    """Guardar un registro de proveedor para la clave"""
+    dht_table.update(data.get("sender", {}))
+    dht_providers.add(int(data["key"], 16), data["provider"])
+    return {"status": "ok"}
+
 # ------------------------------------
 
 @app.get("/network_files")
 async def list_network_files():
     """
     Listar todos los archivos disponibles en la red,
-    incluyendo los archivos de todos los peers remotos.
+    incluyendo los archivos de todos los peers remotos vivos.
+    Los catálogos remotos ya están al día gracias al gossip.
     """
-    network_files = {LOCAL_PEER_NAME: peer_files[LOCAL_PEER_NAME].copy()}
+    network_files = {LOCAL_PEER_NAME: peer_files.files_of(LOCAL_PEER_NAME)}
 
-    for p in config.get("peers", []):
-        try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{p['url']}/files")
-                resp.raise_for_status()
-                remote_files = resp.json().get("peer_files", {}).get(p["name"], [])
-                network_files[p["name"]] = remote_files
-        except Exception:
-            # Ignorar peers que no respondan
-            continue
+    for p in _remote_peers():
+        if p["name"] in peer_files:
+            network_files[p["name"]] = peer_files.files_of(p["name"])
 
     return {"peer_files": network_files}
 
@@ -213,23 +1173,261 @@ async def list_network_files():
 async def refresh_endpoint():
     """Refrescar manualmente los archivos locales y remotos"""
     await refresh_files()
-    return {"status": "ok", "peer_files": peer_files}
+    return {"status": "ok", "peer_files": peer_files.to_dict()}
 
 async def refresh_files():
     """
     Refrescar la lista de archivos locales y de todos los peers remotos.
     """
-    peer_files[LOCAL_PEER_NAME] = [
-        f for f in os.listdir(DIRECTORY)
-        if os.path.isfile(os.path.join(DIRECTORY, f))
+    peer_files.replace_peer(LOCAL_PEER_NAME, _local_files())
+
+    await _query_peers(_sync_remote_catalog, LOCATE_DEADLINE)
+    await _refresh_summaries(LOCATE_DEADLINE, force=True)
+    locate_cache.invalidate()
+
+# --------- Helpers para consultar peers en paralelo ----------
+def _remote_peers():
+    """Peers remotos vivos según la vista de gossip"""
+    return membership.alive_peers()
+
+async def _sync_remote_catalog(p: dict):
+    """
+    Traer solo los cambios del catálogo de un peer remoto desde la última
+    versión conocida y aplicarlos al índice (304 si no cambió nada).
+    """
+    since = peer_files.version(p["name"])
+    headers = {"If-None-Match": f'"v{since}"'} if since is not None else {}
+    resp = await http_client.get(f"{p['url']}/files", params={"since": since or 0}, headers=headers)
+    if resp.status_code == 304:
+        return True
+    resp.raise_for_status()
+
+    data = resp.json()
+    if data["full"]:
+        peer_files.replace_peer(p["name"], data["files"], data["version"])
+        locate_cache.invalidate()
+        # La lista completa no dice qué cambió de contenido: ninguna copia cacheada es segura
+        await asyncio.to_thread(proxy_cache.invalidate, data["files"])
+    else:
+        peer_files.apply_changes(p["name"], data["added"], data["removed"], data["version"])
+        locate_cache.invalidate(data["added"] + data["removed"])
+        await asyncio.to_thread(proxy_cache.invalidate, data["added"] + data["removed"])
+    return True
+
+async def _fetch_remote_summary(p: dict):
+    """Obtener el filtro de Bloom de un peer remoto"""
+    resp = await http_client.get(f"{p['url']}/files/summary")
+    resp.raise_for_status()
+    return BloomFilter.from_dict(resp.json())
+
+async def _refresh_summaries(deadline: float, force: bool = False):
+    """Volver a pedir los filtros de Bloom vencidos (o todos si force=True)"""
+    now = time.monotonic()
+    stale = [
+        p for p in _remote_peers()
+        if force or now - peer_summaries.get(p["name"], (0, None))[0] > SUMMARY_TTL
     ]
+    results = await _query_peers(_fetch_remote_summary, deadline, stale)
+    for name, bloom in results.items():
+        peer_summaries[name] = (now, bloom)
 
-    for p in config.get("peers", []):
-        try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                resp = await client.get(f"{p['url']}/files")
-                resp.raise_for_status()
-                remote_files = resp.json().get("peer_files", {}).get(p["name"], [])
-                peer_files[p["name"]] = remote_files
-        except Exception:
-            continue
+# Refresco de filtros de Bloom en curso (a lo sumo uno a la vez)
+_summary_refresh = None
+
+def _refresh_summaries_soon():
+    """Pedir en segundo plano los filtros vencidos sin esperar la respuesta"""
+    global _summary_refresh
+    if _summary_refresh is None or _summary_refresh.done():
+        _summary_refresh = _spawn(_refresh_summaries(PEER_TIMEOUT))
+
+# --------- Gossip ----------
+async def _gossip_loop():
+    """Cada GOSSIP_INTERVAL segundos intercambiar vistas con GOSSIP_FANOUT peers al azar"""
+    last_probe = time.monotonic()
+    while True:
+        await asyncio.sleep(GOSSIP_INTERVAL)
+        membership.beat(peer_files.version(LOCAL_PEER_NAME))
+        targets = membership.pick_targets(GOSSIP_FANOUT)
+        if time.monotonic() - last_probe >= GOSSIP_DEAD_PROBE_INTERVAL:
+            last_probe = time.monotonic()
+            seed = membership.pick_dead_seed()
+            if seed is not None and seed not in targets:
+                targets.append(seed)
+        await _query_peers(_gossip_with, PEER_TIMEOUT, targets)
+        # Reintentar los catálogos que quedaron atrás de la versión anunciada
+        # (p. ej. porque falló el pedido del delta)
+        _on_catalog_changes([
+            p for p in membership.alive_peers()
+            if membership.version_of(p["name"]) not in (None, peer_files.version(p["name"]))
+        ])
+        # Los miembros vivos que descubre el gossip alimentan la tabla de la DHT
+        for p in membership.alive_peers():
+            dht_table.update(p)
+
+async def _gossip_with(p: dict):
+    resp = await http_client.post(f"{p['url']}/gossip", json={"members": membership.digest()})
+    resp.raise_for_status()
+    _on_catalog_changes(membership.merge(resp.json().get("members", [])))
+
+_background_tasks = set()
+# Peers cuyo delta se está trayendo ahora: no se pide dos veces a la vez
+_catalog_pulls = set()
+
+def _on_catalog_changes(changed):
+    """Traer en segundo plano el delta de los peers cuyo catálogo cambió"""
+    for p in changed:
+        # El filtro de Bloom cacheado ya no corresponde a la versión anunciada
+        peer_summaries.pop(p["name"], None)
+    changed = [p for p in changed if p["name"] not in _catalog_pulls]
+    if changed:
+        _spawn(_pull_catalogs(changed))
+
+async def _pull_catalogs(peers):
+    names = {p["name"] for p in peers}
+    _catalog_pulls.update(names)
+    try:
+        await _query_peers(_sync_remote_catalog, LOCATE_DEADLINE, peers)
+    finally:
+        _catalog_pulls.difference_update(names)
+
+def _spawn(coro):
+    """Lanzar una tarea en segundo plano guardando la referencia"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+# --------- DHT ----------
+async def _dht_rpc(contact: dict, method: str, payload: dict):
+    if not breaker.allow(contact["name"]):
+        raise CircuitOpenError(contact["name"])
+    return await _timed_call(
+        contact["name"],
+        _post_json(f"{contact['url']}/dht/{method}", dict(payload, sender=LOCAL_CONTACT)),
+    )
+
+async def _post_json(url: str, payload: dict):
+    resp = await http_client.post(url, json=payload)
+    resp.raise_for_status()
+    return resp.json()
+
+async def _get_json(url: str, **kwargs):
+    resp = await http_client.get(url, **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+async def _dht_publish(filename: str):
+    """Publicar "este peer tiene filename" en los k nodos más cercanos a su clave"""
+    key = key_for(filename)
+    closest, _ = await iterative_lookup(dht_table, key, _dht_rpc)
+    payload = {"key": format(key, "x"), "provider": LOCAL_CONTACT}
+    await asyncio.gather(*(_dht_rpc(c, "add_provider", payload) for c in closest), return_exceptions=True)
+
+    # Si este nodo está entre los k más cercanos también guarda el registro
+    if len(closest) < dht_table.k or (dht_table.local_id ^ key) < (key_for(closest[-1]["name"]) ^ key):
+        dht_providers.add(key, LOCAL_CONTACT)
+
+async def _dht_republish_loop():
+    """Publicar todos los archivos locales al arrancar y luego periódicamente"""
+    limit = asyncio.Semaphore(8)
+
+    async def publish(filename: str):
+        async with limit:
+            try:
+                await _dht_publish(filename)
+            except Exception:
+                pass
+
+    while True:
+        await asyncio.gather(*(publish(f) for f in peer_files.files_of(LOCAL_PEER_NAME)))
+        await asyncio.sleep(DHT_REPUBLISH_INTERVAL)
+
+async def _query_peers(fetch, deadline: float, peers=None):
+    """
+    Ejecutar fetch(peer) contra los peers remotos (todos, o los indicados) a la vez.
+    Devuelve {nombre_peer: resultado} solo para los peers que respondieron
+    correctamente antes del deadline; los demás se cancelan e ignoran.
+    """
+    async with aclosing(_iter_peers(fetch, deadline, peers)) as replies:
+        return {p["name"]: result async for p, result in replies}
+
+async def _iter_peers(fetch, deadline: float, peers=None):
+    """
+    Igual que _query_peers, pero entrega (peer, resultado) apenas responde
+    cada peer. Si quien consume deja de iterar, se cancelan los que faltan.
+    """
+    if peers is None:
+        peers = _remote_peers()
+    # Los peers con el circuito abierto se saltan sin esperar su timeout
+    peers = [p for p in peers if breaker.allow(p["name"])]
+    tasks = {asyncio.create_task(_timed_call(p["name"], fetch(p))): p for p in peers}
+    end = time.monotonic() + deadline
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(end - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # Quien no respondió antes del deadline cuenta como fallo
+                for task in pending:
+                    peer_stats.record_failure(tasks[task]["name"])
+                    breaker.record_failure(tasks[task]["name"])
+                break
+            for task in done:
+                if task.exception() is None:
+                    yield tasks[task], task.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # marcar como leída aunque nadie la haya consumido
+
+async def _timed_call(peer: str, call):
+    """Esperar la corrutina call registrando su RTT o su fallo en peer_stats"""
+    start = time.monotonic()
+    try:
+        result = await call
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        peer_stats.record_failure(peer)
+        _breaker_record(peer, e)
+        raise
+    peer_stats.record_success(peer, rtt=time.monotonic() - start)
+    breaker.record_success(peer)
+    return result
+
+def _breaker_record(peer: str, error: Exception):
+    """
+    Registrar un error en el circuit breaker del peer.
+    Un 4xx significa que el peer está vivo y respondió: no abre el circuito.
+    """
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500:
+        breaker.record_success(peer)
+    else:
+        breaker.record_failure(peer)
+
+# --------- Circuit breaker ----------
+async def _breaker_probe_loop():
+    """Sondear en segundo plano los peers con el circuito abierto hasta que vuelvan"""
+    while True:
+        await asyncio.sleep(BREAKER_PROBE_INTERVAL)
+        due = breaker.due_for_probe()
+        if due:
+            await asyncio.gather(*(_probe_peer(name) for name in due))
+
+async def _probe_peer(name: str):
+    """Sonda liviana: GET / del peer"""
+    member = membership.to_dict().get(name)
+    if member is None:
+        breaker.record_failure(name)
+        return
+    try:
+        resp = await http_client.get(f"{member['url']}/", timeout=PEER_TIMEOUT)
+        resp.raise_for_status()
+    except Exception:
+        breaker.record_failure(name)
+    else:
+        breaker.record_success(name)
@@ -0,0 +1,75 @@
+import threading
+
+# --------- Índice de archivos por peer ----------
+class FileIndex:
+    """
+    Índice invertido del catálogo de la red.
+    Mantiene filename -> peers y peer -> filenames con sets,
+    así que consultar quién tiene un archivo es O(1) sin importar
+    cuántos archivos tenga cada peer.
+    """
+
+    def __init__(self):
+        self._by_file = {}
+        self._by_peer = {}
+        self._lock = threading.Lock()
+
+    def add(self, peer: str, filename: str):
+        """Registrar un archivo en un peer. Devuelve False si ya estaba."""
+        with self._lock:
+            files = self._by_peer.setdefault(peer, set())
+            if filename in files:
+                return False
+            files.add(filename)
+            self._by_file.setdefault(filename, set()).add(peer)
+            return True
+
+    def remove(self, peer: str, filename: str):
+        """Quitar un archivo de un peer. Devuelve False si no estaba."""
+        with self._lock:
+            files = self._by_peer.get(peer)
+            if not files or filename not in files:
+                return False
+            files.discard(filename)
+            self._discard_holder(filename, peer)
+            return True
+
+    def replace_peer(self, peer: str, filenames):
+        """Reemplazar por completo la lista de archivos conocida de un peer"""
+        new_files = set(filenames)
+        with self._lock:
+            old_files = self._by_peer.get(peer, set())
+            for filename in old_files - new_files:
+                self._discard_holder(filename, peer)
+            for filename in new_files - old_files:
+                self._by_file.setdefault(filename, set()).add(peer)
+            self._by_peer[peer] = new_files
+
+    def has(self, peer: str, filename: str):
+        """¿El peer tiene el archivo?"""
+        return filename in self._by_peer.get(peer, ())
+
+    def peers_with(self, filename: str):
+        """Conjunto de peers que tienen el archivo"""
+        with self._lock:
+            return set(self._by_file.get(filename, ()))
+
+    def files_of(self, peer: str):
+        """Lista de archivos de un peer"""
+        with self._lock:
+            return list(self._by_peer.get(peer, ()))
+
+    def __contains__(self, peer: str):
+        return peer in self._by_peer
+
+    def to_dict(self):
+        """Representación {peer: [archivos]} usada en las respuestas JSON"""
+        with self._lock:
+            return {peer: list(files) for peer, files in self._by_peer.items()}
+
+    def _discard_holder(self, filename: str, peer: str):
+        holders = self._by_file.get(filename)
+        if holders is not None:
+            holders.discard(peer)
+            if not holders:
+                del self._by_file[filename]
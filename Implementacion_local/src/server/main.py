@@ -5,6 +5,8 @@ import httpx
 from fastapi import FastAPI, Query, UploadFile, File, Body, Response
 from fastapi.responses import FileResponse, StreamingResponse
 
+from .catalog import FileIndex
+
 # --------- Función para cargar configuración ----------
 def load_config(path: str):
     with open(path, "r") as f:
@@ -19,12 +21,11 @@ LOCAL_PEER_NAME = config.get("name", "peer1")  # nombre de este peer
 LOCAL_PEER_URL = config.get("url", f"http://{config['ip']}:{config['port_rest']}")
 
 # --------- Tabla de archivos por peer ---------
-peer_files = {
-    LOCAL_PEER_NAME: [
-        f for f in os.listdir(DIRECTORY)
-        if os.path.isfile(os.path.join(DIRECTORY, f))
-    ]
-}
+peer_files = FileIndex()
+peer_files.replace_peer(LOCAL_PEER_NAME, [
+    f for f in os.listdir(DIRECTORY)
+    if os.path.isfile(os.path.join(DIRECTORY, f))
+])
 
 # --------- Servidor FastAPI ---------
 app = FastAPI()
@@ -40,7 +41,7 @@ def read_root():
 @app.get("/files")
 async def list_files():
     """Listar los archivos conocidos por cada peer"""
-    return {"peer_files": peer_files}
+    return {"peer_files": peer_files.to_dict()}
 
 # --------- Endpoint /locate ----------
 @app.get("/locate")
@@ -51,23 +52,22 @@ async def locate_file(filename: str = Query(...)):
     Si está en otro peer, busca la URL en la lista de peers conocidos.
     """
     sources = []
-
-    for peer, files in peer_files.items():
-        if filename in files:
-            # Archivo en este peer
-            if peer == LOCAL_PEER_NAME:
-                sources.append({
-                    "peer": peer,
-                    "download_url": f"{LOCAL_PEER_URL}/download/{filename}"
-                })
-            # Archivo en peers remotos
-            else:
-                for p in config.get("peers", []):
-                    if p.get("name") == peer:
-                        sources.append({
-                            "peer": peer,
-                            "download_url": f"{p['url']}/download/{filename}"
-                        })
+    holders = peer_files.peers_with(filename)
+
+    # Archivo en este peer
+    if LOCAL_PEER_NAME in holders:
+        sources.append({
+            "peer": LOCAL_PEER_NAME,
+            "download_url": f"{LOCAL_PEER_URL}/download/{filename}"
+        })
+
+    # Archivo en peers remotos
+    for p in config.get("peers", []):
+        if p.get("name") in holders and p["name"] != LOCAL_PEER_NAME:
+            sources.append({
+                "peer": p["name"],
+                "download_url": f"{p['url']}/download/{filename}"
+            })
 
     if sources:
         return {
@@ -116,8 +116,7 @@ async def upload_file(file: UploadFile = File(...)):
     try:
         with open(file_path, "wb") as f:
             f.write(await file.read())
-        if file.filename not in peer_files[LOCAL_PEER_NAME]:
-            peer_files[LOCAL_PEER_NAME].append(file.filename)
+        peer_files.add(LOCAL_PEER_NAME, file.filename)
         return {"status": "ok", "filename": file.filename}
     except Exception as e:
         return {"error": str(e)}
@@ -148,14 +147,10 @@ async def add_file(data: dict = Body(...)):
     if not peer or not filename:
         return {"error": "Se requieren 'peer' y 'filename'"}
 
-    if peer not in peer_files:
-        peer_files[peer] = []
-
-    if filename not in peer_files[peer]:
-        peer_files[peer].append(filename)
-        return {"status": "ok", "peer": peer, "files": peer_files[peer]}
+    if peer_files.add(peer, filename):
+        return {"status": "ok", "peer": peer, "files": peer_files.files_of(peer)}
     else:
-        return {"status": "ya existe", "peer": peer, "files": peer_files[peer]}
+        return {"status": "ya existe", "peer": peer, "files": peer_files.files_of(peer)}
 
 # --------- Endpoint /peers ----------
 @app.get("/peers")